@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 from decouple import config
+from kombu import Exchange, Queue
 from pathlib import Path
 import os
 
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'rest_framework',          # For REST APIs
     'corsheaders',             # For handling CORS
     'drf_yasg',                # For Swagger documentation
+    'django_filters',          # For query parameter filtering
     'listings',
 ]
 
@@ -132,7 +134,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'listings.pagination.CachedCountPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -142,7 +144,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'listings.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
@@ -171,6 +173,24 @@ SWAGGER_SETTINGS = {
     }
 }
 
+# ===== CACHE CONFIGURATION =====
+
+if DEBUG:
+    # For development, use the local memory cache
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    # For production, share the Redis server used by Celery
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_URL', default='redis://localhost:6379/1'),
+        }
+    }
+
 # ===== CELERY CONFIGURATION =====
 
 # Celery Configuration Options
@@ -189,17 +209,44 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
 
+# Task queues
+# Email notifications can be regenerated, so their queue is transient
+# (non-durable, non-persistent messages) to skip broker disk writes.
+# Tasks that call the Chapa API are I/O-bound and go to the 'http' queue,
+# served by a gevent worker. Webhook and cleanup tasks get their own queues
+# so long-running work never delays user-facing emails. Run one worker per
+# queue:
+#   celery -A alx_travel_app worker -Q http -P gevent -c 500 --prefetch-multiplier=1 -O fair
+#   celery -A alx_travel_app worker -Q emails
+#   celery -A alx_travel_app worker -Q webhooks
+#   celery -A alx_travel_app worker -Q cleanup
+#   celery -A alx_travel_app worker -Q celery
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_QUEUES = (
+    Queue('celery', routing_key='celery'),
+    Queue('emails', Exchange('emails', delivery_mode=1), routing_key='emails', durable=False),
+    Queue('http', routing_key='http'),
+    Queue('webhooks', routing_key='webhooks'),
+    Queue('cleanup', routing_key='cleanup'),
+)
+
 # Task routing (optional - for organizing tasks)
+# Exact task names take precedence over the glob patterns.
 CELERY_TASK_ROUTES = {
-    'listings.tasks.send_booking_confirmation_email': {'queue': 'emails'},
-    'listings.tasks.send_booking_cancellation_email': {'queue': 'emails'},
-    'listings.tasks.send_payment_confirmation_email': {'queue': 'emails'},
+    'listings.tasks.process_chapa_webhook': {'queue': 'webhooks'},
+    'listings.tasks.create_and_initiate_payment': {'queue': 'http'},
+    'listings.tasks.send_*': {'queue': 'emails'},
+    'listings.tasks.cleanup_*': {'queue': 'cleanup'},
+    'listings.tasks.*chapa*': {'queue': 'http'},
 }
 
 # Worker configuration
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 
+# Acknowledge tasks after they run so a killed worker requeues them
+CELERY_TASK_ACKS_LATE = True
+
 # Task execution configuration
 CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
 CELERY_TASK_EAGER_PROPAGATES = True
@@ -223,6 +270,10 @@ FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 # Webhook URL for Chapa callbacks
 CHAPA_WEBHOOK_URL = config('CHAPA_WEBHOOK_URL', default=f'http://localhost:8000/api/payments/webhook/chapa/')
 
+# Secret hash configured in the Chapa dashboard; webhooks signed with it are
+# trusted without re-verifying the transaction over the API
+CHAPA_WEBHOOK_SECRET = config('CHAPA_WEBHOOK_SECRET', default='')
+
 # Create logs directory if it doesn't exist
 logs_dir = BASE_DIR / 'logs'
 if not logs_dir.exists():
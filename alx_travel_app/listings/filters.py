@@ -0,0 +1,62 @@
+import django_filters
+
+from .models import Listing, Booking, Review, Payment
+
+
+class ListingFilter(django_filters.FilterSet):
+    """
+    Query parameter filters for listings
+    """
+    location = django_filters.CharFilter(lookup_expr='icontains')
+    property_type = django_filters.CharFilter()
+    available = django_filters.CharFilter(method='filter_available')
+    min_price = django_filters.NumberFilter(field_name='price_per_night', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price_per_night', lookup_expr='lte')
+    guests = django_filters.NumberFilter(field_name='max_guests', lookup_expr='gte')
+
+    class Meta:
+        model = Listing
+        fields = ['location', 'property_type', 'available', 'min_price', 'max_price', 'guests']
+
+    def filter_available(self, queryset, name, value):
+        """Treat true, 1 and yes as available and anything else as unavailable"""
+        return queryset.filter(available=value.lower() in ['true', '1', 'yes'])
+
+
+class BookingFilter(django_filters.FilterSet):
+    """
+    Query parameter filters for bookings
+    """
+    status = django_filters.CharFilter()
+    user_id = django_filters.NumberFilter()
+    # Compares the foreign key column, so the listing isn't joined
+    listing_id = django_filters.UUIDFilter()
+
+    class Meta:
+        model = Booking
+        fields = ['status', 'user_id', 'listing_id']
+
+
+class ReviewFilter(django_filters.FilterSet):
+    """
+    Query parameter filters for reviews
+    """
+    listing_id = django_filters.UUIDFilter()
+    user_id = django_filters.NumberFilter()
+    min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
+
+    class Meta:
+        model = Review
+        fields = ['listing_id', 'user_id', 'min_rating']
+
+
+class PaymentFilter(django_filters.FilterSet):
+    """
+    Query parameter filters for payments
+    """
+    status = django_filters.CharFilter()
+    booking_id = django_filters.UUIDFilter()
+
+    class Meta:
+        model = Payment
+        fields = ['status', 'booking_id']
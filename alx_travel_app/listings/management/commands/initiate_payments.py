@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from listings.models import Payment
+from listings.services import get_chapa_service
+
+
+class Command(BaseCommand):
+    help = 'Initiate all pending payments with Chapa in one concurrent batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of payments to initiate'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=10,
+            help='Number of concurrent Chapa requests'
+        )
+
+    def handle(self, *args, **options):
+        payments = list(
+            Payment.objects.with_related().filter(status='pending')[:options['limit']]
+        )
+
+        if not payments:
+            self.stdout.write(self.style.WARNING('No pending payments found'))
+            return
+
+        chapa_service = get_chapa_service()
+        chapa_service.initiate_payments_bulk(payments, max_workers=options['workers'])
+
+        initiated = sum(1 for payment in payments if payment.status == 'processing')
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Initiated {initiated} of {len(payments)} pending payments')
+        )
@@ -186,6 +186,18 @@ class Command(BaseCommand):
         statuses = ['pending', 'confirmed', 'completed', 'cancelled']
         status_weights = [0.1, 0.4, 0.4, 0.1]  # Most bookings are confirmed or completed
         
+        # Date ranges already held by active bookings, per listing. Conflicts
+        # are skipped up front so every booking can be inserted in one batch
+        # without tripping the overlap constraint.
+        active_statuses = ('confirmed', 'pending', 'payment_pending')
+        booked = {}
+        existing = Booking.objects.filter(
+            listing__in=available_listings,
+            status__in=active_statuses
+        ).values_list('listing_id', 'check_in_date', 'check_out_date')
+        for listing_id, check_in, check_out in existing:
+            booked.setdefault(listing_id, []).append((check_in, check_out))
+        
         for i in range(count):
             listing = random.choice(available_listings)
             user = random.choice([u for u in users if u != listing.host])  # Guest can't be the host
@@ -199,29 +211,34 @@ class Command(BaseCommand):
             if start_date >= end_date:
                 continue
             
-            try:
-                booking = Booking.objects.create(
-                    listing=listing,
-                    user=user,
-                    check_in_date=start_date,
-                    check_out_date=end_date,
-                    number_of_guests=random.randint(1, min(listing.max_guests, 6)),
-                    total_price=listing.price_per_night * duration,
-                    status=random.choices(statuses, weights=status_weights)[0],
-                    special_requests=random.choice([
-                        '', '', '',  # Most bookings have no special requests
-                        'Early check-in please',
-                        'Late check-out if possible',
-                        'Extra towels needed',
-                        'Quiet room preferred'
-                    ])
-                )
-                bookings.append(booking)
-            except Exception as e:
-                # Skip if there's a conflict
-                continue
+            status = random.choices(statuses, weights=status_weights)[0]
+            
+            # Skip if there's a conflict
+            if status in active_statuses:
+                ranges = booked.setdefault(listing.listing_id, [])
+                if any(start_date < check_out and end_date > check_in for check_in, check_out in ranges):
+                    continue
+                ranges.append((start_date, end_date))
+            
+            bookings.append(Booking(
+                listing=listing,
+                user=user,
+                check_in_date=start_date,
+                check_out_date=end_date,
+                duration_nights=duration,  # bulk_create bypasses Booking.save()
+                number_of_guests=random.randint(1, min(listing.max_guests, 6)),
+                total_price=listing.price_per_night * duration,
+                status=status,
+                special_requests=random.choice([
+                    '', '', '',  # Most bookings have no special requests
+                    'Early check-in please',
+                    'Late check-out if possible',
+                    'Extra towels needed',
+                    'Quiet room preferred'
+                ])
+            ))
         
-        return bookings
+        return Booking.objects.bulk_create(bookings)
 
     def create_reviews(self, users, listings, bookings, count):
         """Create sample reviews"""
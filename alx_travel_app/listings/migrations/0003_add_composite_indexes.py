@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_add_payment_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['available', 'location', 'price_per_night'], name='listings_li_availab_6d7361_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['property_type', 'available'], name='listings_li_propert_7fa785_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'check_in_date', 'check_out_date'], name='listings_bo_listing_218909_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'status'], name='listings_bo_user_id_f12e91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'created_at'], name='listings_pa_status_0db908_idx'),
+        ),
+    ]
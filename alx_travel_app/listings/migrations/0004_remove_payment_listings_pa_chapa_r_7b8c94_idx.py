@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-15 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_add_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='listings_pa_chapa_r_7b8c94_idx',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-15 10:05
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def populate_review_stats(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    listings = Listing.objects.annotate(avg=Avg('reviews__rating'), count=Count('reviews'))
+    for listing in listings.filter(count__gt=0):
+        Listing.objects.filter(pk=listing.pk).update(
+            avg_rating=round(listing.avg, 2),
+            reviews_count=listing.count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_remove_payment_listings_pa_chapa_r_7b8c94_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, help_text="Average rating of the listing's reviews", max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of reviews for the listing'),
+        ),
+        migrations.RunPython(populate_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-15 10:31
+
+from django.db import migrations, models
+
+
+def populate_duration_nights(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    bookings = list(Booking.objects.only('booking_id', 'check_in_date', 'check_out_date'))
+    for booking in bookings:
+        booking.duration_nights = (booking.check_out_date - booking.check_in_date).days
+    Booking.objects.bulk_update(bookings, ['duration_nights'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='duration_nights',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of nights, computed from the booking dates on save'),
+        ),
+        migrations.RunPython(populate_duration_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Enforce Review booking rules in the database
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE TRIGGER listings_review_booking_insert
+    BEFORE INSERT ON listings_review
+    FOR EACH ROW WHEN NEW.booking_id IS NOT NULL
+    BEGIN
+        SELECT RAISE(ABORT, 'Can only review completed bookings')
+        WHERE (SELECT status FROM listings_booking WHERE booking_id = NEW.booking_id) != 'completed';
+        SELECT RAISE(ABORT, 'Booking must be for the same listing being reviewed')
+        WHERE (SELECT listing_id FROM listings_booking WHERE booking_id = NEW.booking_id) != NEW.listing_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER listings_review_booking_update
+    BEFORE UPDATE OF booking_id, listing_id ON listings_review
+    FOR EACH ROW WHEN NEW.booking_id IS NOT NULL
+    BEGIN
+        SELECT RAISE(ABORT, 'Can only review completed bookings')
+        WHERE (SELECT status FROM listings_booking WHERE booking_id = NEW.booking_id) != 'completed';
+        SELECT RAISE(ABORT, 'Booking must be for the same listing being reviewed')
+        WHERE (SELECT listing_id FROM listings_booking WHERE booking_id = NEW.booking_id) != NEW.listing_id;
+    END;
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_review_booking_insert;",
+    "DROP TRIGGER IF EXISTS listings_review_booking_update;",
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION listings_review_booking_check() RETURNS trigger AS $$
+    DECLARE
+        booking_row listings_booking%ROWTYPE;
+    BEGIN
+        IF NEW.booking_id IS NULL THEN
+            RETURN NEW;
+        END IF;
+        SELECT * INTO booking_row FROM listings_booking WHERE booking_id = NEW.booking_id;
+        IF booking_row.status <> 'completed' THEN
+            RAISE EXCEPTION 'Can only review completed bookings';
+        END IF;
+        IF booking_row.listing_id <> NEW.listing_id THEN
+            RAISE EXCEPTION 'Booking must be for the same listing being reviewed';
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER listings_review_booking_check
+    BEFORE INSERT OR UPDATE OF booking_id, listing_id ON listings_review
+    FOR EACH ROW EXECUTE FUNCTION listings_review_booking_check();
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_review_booking_check ON listings_review;",
+    "DROP FUNCTION IF EXISTS listings_review_booking_check();",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_booking_duration_nights'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
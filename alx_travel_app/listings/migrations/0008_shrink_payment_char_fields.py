@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-15 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_review_booking_trigger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='chapa_transaction_id',
+            field=models.CharField(blank=True, default='', help_text='Transaction ID from Chapa', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='chapa_reference',
+            field=models.CharField(help_text='Unique reference for Chapa transaction', max_length=40, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='customer_phone',
+            field=models.CharField(blank=True, default='', help_text='Customer phone number', max_length=16),
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Move created_at/updated_at maintenance into the database
+
+import importlib
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# SQLite rebuilds a table on AlterField, which drops its triggers, and
+# refuses to rename a rebuilt table while another table's trigger refers to
+# it. The review booking triggers from 0007 read listings_booking, so they
+# are dropped before the rebuilds and reinstalled below.
+review_booking_trigger = importlib.import_module('listings.migrations.0007_review_booking_trigger')
+
+
+TABLES = [
+    ('listings_listing', 'listing_id'),
+    ('listings_booking', 'booking_id'),
+    ('listings_payment', 'payment_id'),
+    ('listings_review', 'review_id'),
+]
+
+
+def sqlite_forward(table, pk):
+    # SQLite triggers cannot modify NEW, so the row is touched again after
+    # the update. Rows whose updated_at was set explicitly are left alone.
+    return [
+        f"""
+        CREATE TRIGGER {table}_set_updated_at
+        AFTER UPDATE ON {table}
+        FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE {table} SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')
+            WHERE {pk} = NEW.{pk};
+        END;
+        """,
+    ]
+
+
+def postgresql_forward(table, pk):
+    return [
+        f"""
+        CREATE TRIGGER {table}_set_updated_at
+        BEFORE UPDATE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION listings_set_updated_at();
+        """,
+    ]
+
+
+POSTGRESQL_FUNCTION = """
+    CREATE FUNCTION listings_set_updated_at() RETURNS trigger AS $$
+    BEGIN
+        NEW.updated_at = now();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def drop_review_booking_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in review_booking_trigger.SQLITE_REVERSE:
+            schema_editor.execute(statement, params=None)
+
+
+def create_review_booking_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in review_booking_trigger.SQLITE_FORWARD:
+            schema_editor.execute(statement, params=None)
+
+
+def create_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_FUNCTION, params=None)
+        build = postgresql_forward
+    elif vendor == 'sqlite':
+        create_review_booking_triggers(apps, schema_editor)
+        build = sqlite_forward
+    else:
+        return
+    for table, pk in TABLES:
+        for statement in build(table, pk):
+            schema_editor.execute(statement, params=None)
+
+
+def drop_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, pk in TABLES:
+        if vendor == 'postgresql':
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_set_updated_at ON {table};", params=None)
+        elif vendor == 'sqlite':
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_set_updated_at;", params=None)
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP FUNCTION IF EXISTS listings_set_updated_at();", params=None)
+    drop_review_booking_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_shrink_payment_char_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_review_booking_triggers, create_review_booking_triggers),
+        migrations.AlterField(
+            model_name='listing',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the listing was created'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the listing was last updated'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the booking was created'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the booking was last updated'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the payment record was created'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the payment record was last updated'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the review was created'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False, help_text='When the review was last updated'),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
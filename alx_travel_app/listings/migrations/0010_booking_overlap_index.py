@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-15 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_database_managed_timestamps'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='listings_bo_listing_218909_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'status', 'check_in_date', 'check_out_date'], name='listings_bo_listing_527bcf_idx'),
+        ),
+    ]
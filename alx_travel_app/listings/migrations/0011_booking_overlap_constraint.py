@@ -0,0 +1,82 @@
+# Reject overlapping active bookings for the same listing in the database
+#
+# PostgreSQL uses an exclusion constraint over the booked date range. SQLite
+# has no equivalent, so triggers perform the same check there. SQLite drops
+# triggers when a table is rebuilt, so any later migration that alters
+# listings_booking must reinstall them (see 0009 for an example).
+
+from django.db import migrations
+
+
+ACTIVE_STATUSES = "('confirmed', 'pending', 'payment_pending')"
+
+SQLITE_OVERLAP_CHECK = f"""
+    BEGIN
+        SELECT RAISE(ABORT, 'Booking dates overlap an existing booking')
+        WHERE EXISTS (
+            SELECT 1 FROM listings_booking
+            WHERE listing_id = NEW.listing_id
+              AND status IN {ACTIVE_STATUSES}
+              AND check_in_date < NEW.check_out_date
+              AND check_out_date > NEW.check_in_date
+              AND booking_id != NEW.booking_id
+        );
+    END;
+"""
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER listings_booking_overlap_insert
+    BEFORE INSERT ON listings_booking
+    FOR EACH ROW WHEN NEW.status IN {ACTIVE_STATUSES}
+    {SQLITE_OVERLAP_CHECK}
+    """,
+    f"""
+    CREATE TRIGGER listings_booking_overlap_update
+    BEFORE UPDATE OF listing_id, status, check_in_date, check_out_date ON listings_booking
+    FOR EACH ROW WHEN NEW.status IN {ACTIVE_STATUSES}
+    {SQLITE_OVERLAP_CHECK}
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_booking_overlap_insert;",
+    "DROP TRIGGER IF EXISTS listings_booking_overlap_update;",
+]
+
+POSTGRESQL_FORWARD = [
+    # Needed for the equality operator on listing_id in a GiST index
+    "CREATE EXTENSION IF NOT EXISTS btree_gist;",
+    f"""
+    ALTER TABLE listings_booking ADD CONSTRAINT listings_booking_no_overlap
+    EXCLUDE USING gist (
+        listing_id WITH =,
+        daterange(check_in_date, check_out_date, '[)') WITH &&
+    ) WHERE (status IN {ACTIVE_STATUSES});
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "ALTER TABLE listings_booking DROP CONSTRAINT IF EXISTS listings_booking_no_overlap;",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_booking_overlap_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-15 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_booking_overlap_constraint'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='listings_bo_status_8650c6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'check_in_date'], name='listings_bo_status_da764e_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Full-text search over listing name, description and amenities
+#
+# PostgreSQL gets a GIN index over the tsvector expression that
+# ListingQuerySet.search() matches against. SQLite gets an FTS5 table kept
+# in sync by triggers. SQLite drops triggers when a table is rebuilt, so
+# any later migration that alters listings_listing must reinstall them.
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE listings_listing_fts USING fts5(
+        listing_id UNINDEXED, name, description, amenities
+    );
+    """,
+    """
+    INSERT INTO listings_listing_fts (listing_id, name, description, amenities)
+    SELECT listing_id, name, description, amenities FROM listings_listing;
+    """,
+    """
+    CREATE TRIGGER listings_listing_fts_insert
+    AFTER INSERT ON listings_listing
+    BEGIN
+        INSERT INTO listings_listing_fts (listing_id, name, description, amenities)
+        VALUES (NEW.listing_id, NEW.name, NEW.description, NEW.amenities);
+    END;
+    """,
+    """
+    CREATE TRIGGER listings_listing_fts_update
+    AFTER UPDATE OF name, description, amenities ON listings_listing
+    BEGIN
+        UPDATE listings_listing_fts
+        SET name = NEW.name, description = NEW.description, amenities = NEW.amenities
+        WHERE listing_id = NEW.listing_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER listings_listing_fts_delete
+    AFTER DELETE ON listings_listing
+    BEGIN
+        DELETE FROM listings_listing_fts WHERE listing_id = OLD.listing_id;
+    END;
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_listing_fts_insert;",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_update;",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_delete;",
+    "DROP TABLE IF EXISTS listings_listing_fts;",
+]
+
+# Must match ListingQuerySet.POSTGRESQL_SEARCH_VECTOR for the index to be used
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX listings_listing_search_gin ON listings_listing USING gin (
+        to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(amenities, ''))
+    );
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS listings_listing_search_gin;",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_booking_status_check_in_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
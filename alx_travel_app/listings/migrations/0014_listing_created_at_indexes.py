@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-15 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', '-created_at'], name='listings_bo_listing_0582fa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', '-created_at'], name='listings_re_listing_515c5d_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Refresh updated_at on SQLite whenever a row is saved
+#
+# The 0009 triggers skipped rows whose updated_at text was unchanged, but
+# the trigger stores milliseconds ('...58.865') while a full save() writes
+# the loaded value back as microseconds ('...58.865000'). The strings never
+# matched, so saves didn't refresh updated_at. Comparing julianday() values
+# compares the times instead. PostgreSQL's triggers are unaffected.
+
+import importlib
+
+from django.db import migrations
+
+database_managed_timestamps = importlib.import_module('listings.migrations.0009_database_managed_timestamps')
+TABLES = database_managed_timestamps.TABLES
+
+
+def sqlite_forward(table, pk):
+    # The trigger's own update sets a new time, so it doesn't match itself
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_set_updated_at;",
+        f"""
+        CREATE TRIGGER {table}_set_updated_at
+        AFTER UPDATE ON {table}
+        FOR EACH ROW WHEN julianday(NEW.updated_at) IS julianday(OLD.updated_at)
+        BEGIN
+            UPDATE {table} SET updated_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')
+            WHERE {pk} = NEW.{pk};
+        END;
+        """,
+    ]
+
+
+def sqlite_reverse(table, pk):
+    return [f"DROP TRIGGER IF EXISTS {table}_set_updated_at;"] + database_managed_timestamps.sqlite_forward(table, pk)
+
+
+def run_for_tables(build):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for table, pk in TABLES:
+            for statement in build(table, pk):
+                schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listing_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_for_tables(sqlite_forward), run_for_tables(sqlite_reverse)),
+    ]
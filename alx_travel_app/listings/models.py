@@ -1,9 +1,67 @@
-from django.db import models
+"""
+Models for the listings app.
+
+Views that list bookings or payments should call ``with_related()`` on the
+queryset so the related rows are fetched with a JOIN instead of one query
+per object.
+
+``created_at`` and ``updated_at`` are filled in by the database: both default
+to the current time on insert and a trigger refreshes ``updated_at`` on every
+update (see migrations 0009 and 0015).
+"""
+from django.core.cache import cache
+from django.db import connections, models
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Now
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+import re
 import uuid
 
 
+class ListingQuerySet(models.QuerySet):
+    """
+    QuerySet for Listing with search helpers
+    """
+    # Indexed on PostgreSQL by migration 0013; keep the two in sync
+    POSTGRESQL_SEARCH_VECTOR = (
+        "to_tsvector('english', coalesce(listings_listing.name, '') || ' ' || "
+        "coalesce(listings_listing.description, '') || ' ' || coalesce(listings_listing.amenities, ''))"
+    )
+    
+    def search(self, text):
+        """
+        Full-text search over name, description and amenities
+        
+        Every word of text must match. PostgreSQL matches stemmed words,
+        SQLite matches word prefixes (see migration 0013); other databases
+        fall back to substring matching.
+        """
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            return self.filter(RawSQL(
+                f"{self.POSTGRESQL_SEARCH_VECTOR} @@ plainto_tsquery('english', %s)",
+                [text],
+                output_field=models.BooleanField(),
+            ))
+        
+        words = re.findall(r'\w+', text)
+        if vendor == 'sqlite' and words:
+            match = ' '.join(f'"{word}"*' for word in words)
+            return self.filter(listing_id__in=RawSQL(
+                "SELECT listing_id FROM listings_listing_fts WHERE listings_listing_fts MATCH %s",
+                [match],
+            ))
+        
+        return self.filter(
+            Q(name__icontains=text) |
+            Q(description__icontains=text) |
+            Q(amenities__icontains=text)
+        )
+
+
 class Listing(models.Model):
     """
     Model representing a travel listing (hotel, apartment, etc.)
@@ -87,14 +145,31 @@ class Listing(models.Model):
     )
     
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the listing was created"
     )
     
     updated_at = models.DateTimeField(
-        auto_now=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the listing was last updated"
     )
+    
+    # Review statistics, kept up to date by the Review signals
+    avg_rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        help_text="Average rating of the listing's reviews"
+    )
+    
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of reviews for the listing"
+    )
+
+    objects = ListingQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -103,23 +178,65 @@ class Listing(models.Model):
             models.Index(fields=['property_type']),
             models.Index(fields=['price_per_night']),
             models.Index(fields=['available']),
+            models.Index(fields=['available', 'location', 'price_per_night']),
+            models.Index(fields=['property_type', 'available']),
         ]
 
     def __str__(self):
         return f"{self.name} - {self.location}"
     
+    def save(self, *args, **kwargs):
+        """Override save to store amenities in a normalized form"""
+        if self.amenities:
+            self.amenities = ', '.join(
+                amenity.strip() for amenity in self.amenities.split(',') if amenity.strip()
+            )
+        super().save(*args, **kwargs)
+    
     @property
     def average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+        """Get average rating from reviews"""
+        return self.avg_rating
     
     @property
     def total_reviews(self):
         """Get total number of reviews"""
-        return self.reviews.count()
+        return self.reviews_count
+    
+    @staticmethod
+    def meta_cache_key(listing_id):
+        """Cache key for the fields booking validation reads from a listing"""
+        return f'listing:meta:{listing_id}'
+
+
+class BookingQuerySet(models.QuerySet):
+    """
+    QuerySet for Booking with related-object helpers
+    """
+    # Relations joined for each serialized Booking field
+    RELATED_FIELDS = {
+        'listing': ('listing', 'listing__host'),
+        'user': ('user',),
+        'payment': ('payment',),
+    }
+    
+    def with_related(self, fields=None):
+        """
+        Fetch listing, host, user and payment in the same query
+        
+        If the serialized field names are given, only the relations those
+        fields need are joined.
+        """
+        if fields is None:
+            return self.select_related('listing', 'listing__host', 'user', 'payment')
+        
+        relations = [
+            relation
+            for field in fields
+            for relation in self.RELATED_FIELDS.get(field, ())
+        ]
+        # select_related() with no arguments would follow every foreign key
+        return self.select_related(*relations) if relations else self
 
 
 class Booking(models.Model):
@@ -189,22 +306,35 @@ class Booking(models.Model):
         help_text="Any special requests from the guest"
     )
     
+    duration_nights = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of nights, computed from the booking dates on save"
+    )
+    
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the booking was created"
     )
     
     updated_at = models.DateTimeField(
-        auto_now=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the booking was last updated"
     )
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['check_in_date']),
             models.Index(fields=['check_out_date']),
-            models.Index(fields=['status']),
+            models.Index(fields=['status', 'check_in_date']),
+            models.Index(fields=['listing', 'status', 'check_in_date', 'check_out_date']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['listing', '-created_at']),
         ]
         constraints = [
             models.CheckConstraint(
@@ -214,7 +344,10 @@ class Booking(models.Model):
         ]
 
     def __str__(self):
-        return f"Booking {self.booking_id} - {self.listing.name}"
+        # Only show the listing name if it was already loaded with the booking
+        if 'listing' in self._state.fields_cache:
+            return f"Booking {self.booking_id} - {self.listing.name}"
+        return f"Booking {self.booking_id} - {self.listing_id}"
     
     def clean(self):
         """Custom validation"""
@@ -228,16 +361,39 @@ class Booking(models.Model):
                 f"Number of guests ({self.number_of_guests}) exceeds maximum allowed ({self.listing.max_guests})"
             )
     
-    @property
-    def duration_nights(self):
-        """Calculate number of nights for the booking"""
-        return (self.check_out_date - self.check_in_date).days
+    def save(self, *args, **kwargs):
+        """Override save to store the number of nights with the dates"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'check_in_date', 'check_out_date'} & set(update_fields):
+            self.duration_nights = (self.check_out_date - self.check_in_date).days
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'duration_nights'}
+        super().save(*args, **kwargs)
     
     def calculate_total_price(self):
         """Calculate total price based on listing price and duration"""
         return self.listing.price_per_night * self.duration_nights
 
 
+class PaymentQuerySet(models.QuerySet):
+    """
+    QuerySet for Payment with related-object helpers
+    """
+    def with_related(self):
+        """Fetch booking, listing and user in the same query"""
+        return self.select_related('booking', 'booking__listing', 'booking__user')
+    
+    def for_booking_ids(self, ids):
+        """Get the payments of several bookings with their booking in one query"""
+        return self.filter(booking_id__in=ids).select_related('booking')
+    
+    def bulk_mark(self, ids, status):
+        """Set the status of many payments with a single UPDATE"""
+        updated = self.filter(pk__in=ids).update(status=status)
+        cache.delete_many([Payment.status_cache_key(payment_id) for payment_id in ids])
+        return updated
+
+
 class Payment(models.Model):
     """
     Model representing a payment transaction via Chapa
@@ -301,9 +457,9 @@ class Payment(models.Model):
     
     # Chapa-specific fields
     chapa_transaction_id = models.CharField(
-        max_length=100,
-        null=True,
+        max_length=40,
         blank=True,
+        default='',
         help_text="Transaction ID from Chapa"
     )
     
@@ -314,7 +470,7 @@ class Payment(models.Model):
     )
     
     chapa_reference = models.CharField(
-        max_length=100,
+        max_length=40,
         unique=True,
         help_text="Unique reference for Chapa transaction"
     )
@@ -325,9 +481,9 @@ class Payment(models.Model):
     )
     
     customer_phone = models.CharField(
-        max_length=20,
-        null=True,
+        max_length=16,
         blank=True,
+        default='',
         help_text="Customer phone number"
     )
     
@@ -357,36 +513,50 @@ class Payment(models.Model):
     )
     
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the payment record was created"
     )
     
     updated_at = models.DateTimeField(
-        auto_now=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the payment record was last updated"
     )
 
+    objects = PaymentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['chapa_transaction_id']),
-            models.Index(fields=['chapa_reference']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at']),
         ]
 
     def __str__(self):
-        return f"Payment {self.payment_id} - {self.booking.booking_id} - {self.status}"
+        return f"Payment {self.payment_id} - {self.booking_id} - {self.status}"
     
     def save(self, *args, **kwargs):
         """Override save to generate reference if not provided"""
         if not self.chapa_reference:
-            # Generate unique reference using booking ID and timestamp
-            import time
-            timestamp = str(int(time.time()))
-            self.chapa_reference = f"ALX-{str(self.booking.booking_id)[:8]}-{timestamp}"
+            # Generate unique reference using booking ID and a random token
+            self.chapa_reference = f"ALX-{self.booking_id.hex[:8]}-{uuid.uuid4().hex[:12]}"
         super().save(*args, **kwargs)
     
+    @staticmethod
+    def status_cache_key(payment_id):
+        """Cache key for the get_payment_status response of a payment"""
+        return f'pay:{payment_id}'
+    
+    def mark_completed(self, chapa_txn_id):
+        """Mark the payment as completed, writing only the changed columns"""
+        self.status = 'completed'
+        self.chapa_transaction_id = chapa_txn_id
+        self.payment_date = timezone.now()
+        self.save(update_fields=['status', 'chapa_transaction_id', 'payment_date'])
+    
     @property
     def is_successful(self):
         """Check if payment was successful"""
@@ -403,6 +573,15 @@ class Payment(models.Model):
         return self.status == 'completed'
 
 
+class ReviewQuerySet(models.QuerySet):
+    """
+    QuerySet for Review with related-object helpers
+    """
+    def with_related(self):
+        """Fetch the reviewer, listing and listing host in the same query"""
+        return self.select_related('user', 'listing', 'listing__host')
+
+
 class Review(models.Model):
     """
     Model representing a review for a listing
@@ -447,20 +626,25 @@ class Review(models.Model):
     )
     
     created_at = models.DateTimeField(
-        auto_now_add=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the review was created"
     )
     
     updated_at = models.DateTimeField(
-        auto_now=True,
+        db_default=Now(),
+        editable=False,
         help_text="When the review was last updated"
     )
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['rating']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['listing', '-created_at']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -476,9 +660,14 @@ class Review(models.Model):
         """Custom validation"""
         from django.core.exceptions import ValidationError
         
+        # The database trigger enforces the same rules; checking here gives
+        # friendlier errors. Reviews without a booking need no lookup.
+        if self.booking_id is None:
+            return
+        
         # Check if user has a completed booking for this listing
-        if self.booking and self.booking.status != 'completed':
+        if self.booking.status != 'completed':
             raise ValidationError("Can only review completed bookings")
         
-        if self.booking and self.booking.listing != self.listing:
+        if self.booking.listing_id != self.listing_id:
             raise ValidationError("Booking must be for the same listing being reviewed")
\ No newline at end of file
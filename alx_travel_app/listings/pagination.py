@@ -0,0 +1,64 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+
+# Seconds a list's row count is cached
+COUNT_CACHE_TIMEOUT = 300
+
+
+def _count_version_key(model):
+    return f'qc:version:{model._meta.label_lower}'
+
+
+def count_cache_version(model):
+    """Current version of a model's cached counts"""
+    return cache.get_or_set(_count_version_key(model), time.time_ns, None)
+
+
+def invalidate_counts(model):
+    """Make every cached count of a model's lists stale"""
+    cache.set(_count_version_key(model), time.time_ns(), None)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that caches the row count of a queryset
+
+    Counts are keyed by the query's SQL, so every page of the same list
+    shares one COUNT(*). They are versioned per model and dropped when a
+    row of that model is saved or deleted (see signals.py); bulk updates
+    are picked up when the count expires.
+    """
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        
+        try:
+            sql = str(query)
+        except EmptyResultSet:
+            return 0
+        
+        model = self.object_list.model
+        key = 'qc:{}:{}:{}'.format(
+            model._meta.label_lower,
+            count_cache_version(model),
+            hashlib.md5(sql.encode()).hexdigest(),
+        )
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+    """PageNumberPagination that reuses the row count across pages"""
+    django_paginator_class = CachedCountPaginator
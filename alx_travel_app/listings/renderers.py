@@ -0,0 +1,24 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson
+
+    orjson handles dicts, lists, strings, numbers, datetimes and UUIDs
+    natively; anything else (Decimal, lazy translations, querysets) goes
+    through DRF's JSONEncoder. Indented output, as requested by the
+    browsable API, is left to JSONRenderer.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        return orjson.dumps(data, default=self._encoder.default, option=orjson.OPT_NAIVE_UTC)
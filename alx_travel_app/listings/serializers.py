@@ -1,9 +1,81 @@
-from rest_framework import serializers
+import copy
+import re
+
+from rest_framework import permissions, serializers
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from .models import Listing, Booking, Review, Payment
+from .tasks import create_and_initiate_payment
+
+
+# Splits on commas and strips the surrounding whitespace in one pass
+_split_amenities = re.compile(r'\s*,\s*').split
 
+# Seconds to cache the listing fields read when validating a booking
+LISTING_META_CACHE_TIMEOUT = 30
 
-class UserSerializer(serializers.ModelSerializer):
+
+class DynamicFieldsMixin:
+    """
+    Lets clients choose the fields they need with ?fields=
+    
+    Names are comma-separated; dotted names select fields of a nested
+    serializer, e.g. ?fields=booking_id,total_price,listing.name
+    Only applied to read requests, so writes always see every field.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        fields = self.requested_fields(self.context.get('request'))
+        if fields:
+            self._restrict_fields(self, fields)
+    
+    @staticmethod
+    def requested_fields(request):
+        """Return the field names requested with ?fields=, or None"""
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return None
+        
+        fields_param = request.query_params.get('fields')
+        if not fields_param:
+            return None
+        
+        return [name.strip() for name in fields_param.split(',') if name.strip()]
+    
+    @classmethod
+    def _restrict_fields(cls, serializer, names):
+        """Drop every field of serializer that names doesn't select"""
+        wanted = {}
+        for name in names:
+            head, _, rest = name.partition('.')
+            wanted.setdefault(head, [])
+            if rest:
+                wanted[head].append(rest)
+        
+        for field_name in list(serializer.fields):
+            if field_name not in wanted:
+                serializer.fields.pop(field_name)
+            elif wanted[field_name] and isinstance(serializer.fields[field_name], serializers.Serializer):
+                cls._restrict_fields(serializer.fields[field_name], wanted[field_name])
+
+
+class CachedFieldsMixin:
+    """
+    Builds a ModelSerializer's fields once per class
+    
+    ModelSerializer introspects the model to build its fields for every
+    serializer instance; this keeps the first result and hands each
+    instance a copy, like Serializer does for declared fields.
+    """
+    def get_fields(self):
+        cls = type(self)
+        if '_cached_fields' not in cls.__dict__:
+            cls._cached_fields = super().get_fields()
+        return copy.deepcopy(cls._cached_fields)
+
+
+class UserSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for User model
     """
@@ -13,7 +85,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Listing model
     """
@@ -50,7 +122,7 @@ class ListingSerializer(serializers.ModelSerializer):
     def get_amenities_list(self, obj):
         """Convert amenities string to list"""
         if obj.amenities:
-            return [amenity.strip() for amenity in obj.amenities.split(',')]
+            return _split_amenities(obj.amenities.strip())
         return []
     
     def create(self, validated_data):
@@ -58,7 +130,8 @@ class ListingSerializer(serializers.ModelSerializer):
         # If host_id is provided, use it; otherwise use the current user
         if 'host_id' in validated_data:
             host_id = validated_data.pop('host_id')
-            validated_data['host'] = User.objects.get(id=host_id)
+            # Only load the columns UserSerializer renders
+            validated_data['host'] = User.objects.only(*UserSerializer.Meta.fields).get(id=host_id)
         else:
             # Assume the current user from the request context
             request = self.context.get('request')
@@ -82,7 +155,39 @@ class ListingSerializer(serializers.ModelSerializer):
         return value
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class ListingListSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    """
+    Read-only serializer for listing lists
+    
+    Leaves out the host details, description and amenities, which the
+    detail view (ListingSerializer) includes.
+    """
+    host_id = serializers.IntegerField(read_only=True)
+    average_rating = serializers.ReadOnlyField()
+    total_reviews = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = Listing
+        fields = [
+            'listing_id',
+            'host_id',
+            'name',
+            'location',
+            'price_per_night',
+            'property_type',
+            'max_guests',
+            'bedrooms',
+            'bathrooms',
+            'available',
+            'average_rating',
+            'total_reviews',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class PaymentSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Payment model
     """
@@ -126,7 +231,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         return value
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(DynamicFieldsMixin, CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Booking model
     """
@@ -136,7 +241,7 @@ class BookingSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(write_only=True, required=False)
     duration_nights = serializers.ReadOnlyField()
     payment = PaymentSerializer(read_only=True)
-    customer_phone = serializers.CharField(write_only=True, required=False, help_text="Customer phone number for payment")
+    customer_phone = serializers.CharField(write_only=True, required=False, max_length=16, help_text="Customer phone number for payment")
     
     class Meta:
         model = Booking
@@ -173,48 +278,66 @@ class BookingSerializer(serializers.ModelSerializer):
         
         # Validate listing exists and is available
         if listing_id:
-            try:
-                listing = Listing.objects.get(listing_id=listing_id)
-                if not listing.available:
-                    raise serializers.ValidationError("This listing is not available for booking")
-            except Listing.DoesNotExist:
+            meta = self._get_listing_meta(listing_id)
+            if meta is None:
                 raise serializers.ValidationError("Invalid listing ID")
             
+            available, max_guests, _ = meta
+            if not available:
+                raise serializers.ValidationError("This listing is not available for booking")
+            
             # Validate number of guests
-            if number_of_guests > listing.max_guests:
+            if number_of_guests > max_guests:
                 raise serializers.ValidationError(
-                    f"Number of guests ({number_of_guests}) exceeds maximum allowed ({listing.max_guests})"
+                    f"Number of guests ({number_of_guests}) exceeds maximum allowed ({max_guests})"
                 )
-            
-            # Check for conflicting bookings
-            if check_in and check_out:
-                conflicting_bookings = Booking.objects.filter(
-                    listing=listing,
-                    status__in=['confirmed', 'pending', 'payment_pending'],
-                    check_in_date__lt=check_out,
-                    check_out_date__gt=check_in
-                )
-                
-                # Exclude current booking if updating
-                if self.instance:
-                    conflicting_bookings = conflicting_bookings.exclude(booking_id=self.instance.booking_id)
-                
-                if conflicting_bookings.exists():
-                    raise serializers.ValidationError("These dates are not available")
         
         return data
     
+    def _get_listing_meta(self, listing_id):
+        """
+        Return (available, max_guests, price_per_night) for a listing
+        
+        Cached briefly so bursts of bookings for a popular listing don't all
+        read the same row. On a cache miss the fetched listing is kept for
+        create(). Returns None if the listing doesn't exist.
+        """
+        key = Listing.meta_cache_key(listing_id)
+        meta = cache.get(key)
+        if meta is None:
+            try:
+                listing = Listing.objects.get(listing_id=listing_id)
+            except Listing.DoesNotExist:
+                return None
+            
+            # Keep the listing so create() doesn't fetch it again
+            self._validated_listing = listing
+            meta = (listing.available, listing.max_guests, listing.price_per_night)
+            cache.set(key, meta, LISTING_META_CACHE_TIMEOUT)
+        
+        self._listing_meta = meta
+        return meta
+    
     def create(self, validated_data):
         """Create a new booking with calculated total price"""
-        listing_id = validated_data.pop('listing_id')
         customer_phone = validated_data.pop('customer_phone', None)
-        listing = Listing.objects.get(listing_id=listing_id)
-        validated_data['listing'] = listing
+        listing = getattr(self, '_validated_listing', None)
+        if listing is not None:
+            validated_data.pop('listing_id')
+            validated_data['listing'] = listing
+            price_per_night = listing.price_per_night
+        else:
+            # Validated from cached metadata; the listing row isn't needed,
+            # so listing_id is passed straight through to the model
+            meta = getattr(self, '_listing_meta', None) or self._get_listing_meta(validated_data['listing_id'])
+            if meta is None:
+                raise serializers.ValidationError("Invalid listing ID")
+            price_per_night = meta[2]
         
         # Set user if not provided
         if 'user_id' in validated_data:
             user_id = validated_data.pop('user_id')
-            validated_data['user'] = User.objects.get(id=user_id)
+            validated_data['user'] = User.objects.only(*UserSerializer.Meta.fields).get(id=user_id)
         else:
             request = self.context.get('request')
             if request and request.user.is_authenticated:
@@ -224,19 +347,37 @@ class BookingSerializer(serializers.ModelSerializer):
         check_in = validated_data['check_in_date']
         check_out = validated_data['check_out_date']
         nights = (check_out - check_in).days
-        validated_data['total_price'] = listing.price_per_night * nights
+        validated_data['total_price'] = price_per_night * nights
         
         # Set initial status to payment_pending
         validated_data['status'] = 'payment_pending'
         
-        # Create booking
-        booking = super().create(validated_data)
+        # Create booking; overlapping dates are rejected by the database
+        # (migration 0011) rather than checked here, which would race
+        try:
+            with transaction.atomic():
+                booking = super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError("These dates are not available")
         
-        # Create payment record
-        from .services import create_payment_for_booking
-        create_payment_for_booking(booking, customer_phone)
+        # Create and initiate the payment once the booking is committed. The
+        # booking is already saved by then, so a broker failure is logged
+        # (robust=True) rather than failing the request.
+        booking_id = str(booking.booking_id)
+        transaction.on_commit(
+            lambda: create_and_initiate_payment.delay(booking_id, customer_phone),
+            robust=True
+        )
         
         return booking
+    
+    def update(self, instance, validated_data):
+        """Update a booking, rejecting dates that overlap another booking"""
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError("These dates are not available")
 
 
 class BookingCreateResponseSerializer(serializers.Serializer):
@@ -244,8 +385,9 @@ class BookingCreateResponseSerializer(serializers.Serializer):
     Serializer for booking creation response with payment information
     """
     booking = BookingSerializer()
-    payment_url = serializers.URLField()
-    payment_id = serializers.UUIDField()
+    payment_url = serializers.URLField(allow_null=True)
+    payment_id = serializers.UUIDField(allow_null=True)
+    payment_status = serializers.CharField()
     message = serializers.CharField()
 
 
@@ -263,12 +405,22 @@ class PaymentStatusSerializer(serializers.Serializer):
     updated_at = serializers.DateTimeField()
 
 
+class BookingBulkStatusSerializer(serializers.Serializer):
+    """
+    Serializer for bulk booking status update request
+    """
+    booking_ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=500
+    )
+    status = serializers.ChoiceField(choices=Booking.BOOKING_STATUS)
+
+
 class PaymentInitiateSerializer(serializers.Serializer):
     """
     Serializer for payment initiation request
     """
     booking_id = serializers.UUIDField()
-    customer_phone = serializers.CharField(required=False)
+    customer_phone = serializers.CharField(required=False, max_length=16)
 
 
 class PaymentVerifySerializer(serializers.Serializer):
@@ -278,7 +430,7 @@ class PaymentVerifySerializer(serializers.Serializer):
     tx_ref = serializers.CharField(help_text="Chapa transaction reference")
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Review model
     """
@@ -317,10 +469,33 @@ class ReviewSerializer(serializers.ModelSerializer):
         # Set user if not provided
         if 'user_id' in validated_data:
             user_id = validated_data.pop('user_id')
-            validated_data['user'] = User.objects.get(id=user_id)
+            validated_data['user'] = User.objects.only(*UserSerializer.Meta.fields).get(id=user_id)
         else:
             request = self.context.get('request')
             if request and request.user.is_authenticated:
                 validated_data['user'] = request.user
         
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class ReviewListSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    """
+    Read-only serializer for review lists
+    
+    Renders the listing as its ID instead of nesting the whole listing.
+    """
+    user = UserSerializer(read_only=True)
+    listing_id = serializers.UUIDField(read_only=True)
+    
+    class Meta:
+        model = Review
+        fields = [
+            'review_id',
+            'listing_id',
+            'user',
+            'rating',
+            'comment',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = fields
@@ -1,13 +1,65 @@
+import hashlib
+import hmac
 import requests
-import json
+import orjson
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from typing import Dict, Any, Optional
+from django.db import transaction
+from typing import Dict, Any, List, Optional, Tuple
 from .models import Payment, Booking
 
 logger = logging.getLogger(__name__)
 
+# Connect and read timeouts for Chapa API requests (seconds)
+CHAPA_TIMEOUT = (3.05, 10)
+
+# Shared HTTP session so connections to Chapa are pooled and kept alive
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+))
+
+# Payment statuses that only change on a refund or a retried initiation, so
+# their status responses are cached longer; saves invalidate them (signals.py)
+TERMINAL_PAYMENT_STATUSES = ('completed', 'failed', 'cancelled', 'refunded')
+
+# Seconds to cache the status of a payment in a terminal state
+TERMINAL_STATUS_CACHE_TIMEOUT = 60 * 60
+
+# Seconds to cache the status of a payment that is still in flight
+PENDING_STATUS_CACHE_TIMEOUT = 5
+
+# Chapa transaction status -> Payment.status
+_STATUS_MAP = {
+    'success': 'completed',
+    'failed': 'failed',
+    'pending': 'processing',
+    'cancelled': 'cancelled',
+}
+
+# Chapa payment method -> Payment.payment_method
+_METHOD_MAP = {
+    'telebirr': 'mobile',
+    'cbebirr': 'mobile',
+    'ebirr': 'mobile',
+    'mpesa': 'mobile',
+    'visa': 'card',
+    'mastercard': 'card',
+    'amex': 'card',
+    'bank': 'bank',
+}
+
+
+class ChapaConnectionError(Exception):
+    """Chapa couldn't be reached or timed out; the request may succeed if retried"""
+
 
 class ChapaPaymentService:
     """
@@ -18,9 +70,12 @@ class ChapaPaymentService:
         self.secret_key = getattr(settings, 'CHAPA_SECRET_KEY', None)
         self.base_url = getattr(settings, 'CHAPA_BASE_URL', 'https://api.chapa.co/v1')
         self.webhook_url = getattr(settings, 'CHAPA_WEBHOOK_URL', None)
+        self.webhook_secret = getattr(settings, 'CHAPA_WEBHOOK_SECRET', '')
         
         if not self.secret_key:
             raise ValidationError("CHAPA_SECRET_KEY not found in settings")
+        
+        self.headers = self._get_headers()
     
     def _get_headers(self) -> Dict[str, str]:
         """Get headers for Chapa API requests"""
@@ -42,45 +97,62 @@ class ChapaPaymentService:
             Response data as dictionary
             
         Raises:
-            Exception: If request fails
+            ChapaConnectionError: If Chapa can't be reached, or a GET times out
+            Exception: If the request fails otherwise
         """
         url = f"{self.base_url}/{endpoint}"
-        headers = self._get_headers()
+        headers = self.headers
         
         try:
             if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, params=data)
+                response = _SESSION.get(url, headers=headers, params=data, timeout=CHAPA_TIMEOUT)
             elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=data)
+                response = _SESSION.post(url, headers=headers, data=orjson.dumps(data), timeout=CHAPA_TIMEOUT)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
             
-        except requests.exceptions.RequestException as e:
+        except requests.exceptions.ConnectionError as e:
+            # Includes connect timeouts: the request never reached Chapa
+            logger.error(f"Chapa API request failed: {str(e)}")
+            raise ChapaConnectionError(f"Payment service error: {str(e)}") from e
+        except requests.exceptions.Timeout as e:
+            # A POST that timed out reading the response may have been
+            # processed, so only GETs are safe to retry
+            logger.error(f"Chapa API request failed: {str(e)}")
+            if method.upper() == 'GET':
+                raise ChapaConnectionError(f"Payment service error: {str(e)}") from e
+            raise Exception(f"Payment service error: {str(e)}")
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             logger.error(f"Chapa API request failed: {str(e)}")
             raise Exception(f"Payment service error: {str(e)}")
     
-    def initiate_payment(self, payment: Payment) -> Dict[str, Any]:
+    def _build_payment_data(self, payment: Payment) -> Dict[str, Any]:
         """
-        Initiate payment with Chapa
+        Build the Chapa initialization payload for a payment
         
         Args:
             payment: Payment model instance
             
         Returns:
-            Response data from Chapa API
+            Request payload for the transaction/initialize endpoint
         """
         booking = payment.booking
         
+        # Split the name once; everything after the first space is the last name
+        name_parts = payment.customer_name.split(' ', 1) if payment.customer_name else ['Guest']
+        first_name = name_parts[0]
+        last_name = name_parts[1] if len(name_parts) > 1 else ''
+        
         # Prepare payment data
         payment_data = {
             'amount': str(payment.amount),
             'currency': payment.currency,
             'email': payment.customer_email,
-            'first_name': payment.customer_name.split(' ')[0] if payment.customer_name else 'Guest',
-            'last_name': ' '.join(payment.customer_name.split(' ')[1:]) if len(payment.customer_name.split(' ')) > 1 else '',
+            'first_name': first_name,
+            'last_name': last_name,
             'phone_number': payment.customer_phone or '',
             'tx_ref': payment.chapa_reference,
             'callback_url': f"{settings.FRONTEND_URL}/payment/callback/{payment.payment_id}/",
@@ -98,6 +170,25 @@ class ChapaPaymentService:
         if self.webhook_url:
             payment_data['webhook'] = self.webhook_url
         
+        return payment_data
+    
+    def initiate_payment(self, payment: Payment) -> Dict[str, Any]:
+        """
+        Initiate payment with Chapa
+        
+        Args:
+            payment: Payment model instance
+            
+        Returns:
+            Response data from Chapa API
+            
+        Raises:
+            ChapaConnectionError: If Chapa can't be reached; the payment is
+                left pending so the initiation can be retried
+        """
+        booking = payment.booking
+        payment_data = self._build_payment_data(payment)
+        
         try:
             response = self._make_request('POST', 'transaction/initialize', payment_data)
             
@@ -105,24 +196,72 @@ class ChapaPaymentService:
             if response.get('status') == 'success':
                 payment.chapa_checkout_url = response['data']['checkout_url']
                 payment.status = 'processing'
-                payment.save()
+                payment.save(update_fields=['chapa_checkout_url', 'status'])
                 
                 logger.info(f"Payment initiated successfully for booking {booking.booking_id}")
                 return response
             else:
                 payment.status = 'failed'
                 payment.failure_reason = response.get('message', 'Unknown error')
-                payment.save()
+                payment.save(update_fields=['status', 'failure_reason'])
                 
                 logger.error(f"Payment initiation failed for booking {booking.booking_id}: {response}")
                 raise Exception(f"Payment initiation failed: {response.get('message', 'Unknown error')}")
                 
+        except ChapaConnectionError:
+            raise
         except Exception as e:
             payment.status = 'failed'
             payment.failure_reason = str(e)
-            payment.save()
+            payment.save(update_fields=['status', 'failure_reason'])
             raise
     
+    def initiate_payments_bulk(self, payments: List[Payment], max_workers: int = 10) -> List[Payment]:
+        """
+        Initiate several payments with Chapa concurrently
+        
+        The HTTP requests run in a thread pool over the shared session, and
+        the results are written back with a single bulk update.
+        
+        Args:
+            payments: Payment instances, ideally fetched with with_related()
+            max_workers: Maximum number of concurrent Chapa requests
+            
+        Returns:
+            The updated Payment instances
+        """
+        if not payments:
+            return []
+        
+        payloads = [self._build_payment_data(payment) for payment in payments]
+        
+        def initialize(payload):
+            try:
+                return self._make_request('POST', 'transaction/initialize', payload)
+            except Exception as e:
+                return e
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(payloads))) as executor:
+            responses = list(executor.map(initialize, payloads))
+        
+        for payment, response in zip(payments, responses):
+            if isinstance(response, Exception):
+                payment.status = 'failed'
+                payment.failure_reason = str(response)
+            elif response.get('status') == 'success':
+                payment.chapa_checkout_url = response['data']['checkout_url']
+                payment.status = 'processing'
+            else:
+                payment.status = 'failed'
+                payment.failure_reason = f"Payment initiation failed: {response.get('message', 'Unknown error')}"
+        
+        Payment.objects.bulk_update(payments, ['status', 'chapa_checkout_url', 'failure_reason'])
+        cache.delete_many([Payment.status_cache_key(p.payment_id) for p in payments])
+        
+        initiated = sum(1 for payment in payments if payment.status == 'processing')
+        logger.info(f"Initiated {initiated} of {len(payments)} payments with Chapa")
+        return payments
+    
     def verify_payment(self, tx_ref: str) -> Dict[str, Any]:
         """
         Verify payment status with Chapa
@@ -147,6 +286,62 @@ class ChapaPaymentService:
             logger.error(f"Payment verification error for tx_ref {tx_ref}: {str(e)}")
             raise
     
+    def _compute_payment_changes(self, payment: Payment, verification_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Work out the payment fields to change for a verification response
+        
+        Args:
+            payment: Payment model instance
+            verification_data: Response from payment verification
+            
+        Returns:
+            Mapping of Payment field names to their new values
+        """
+        data = verification_data.get('data', {})
+        status = data.get('status', '').lower()
+        
+        changes = {
+            'status': _STATUS_MAP.get(status, 'failed'),
+            'chapa_transaction_id': data.get('id') or '',
+            'payment_method': self._get_payment_method(data.get('method')),
+            'webhook_data': verification_data,
+        }
+        
+        if changes['status'] == 'completed':
+            changes['payment_date'] = data.get('created_at')
+        elif changes['status'] == 'failed':
+            changes['failure_reason'] = data.get('failure_reason', 'Payment failed')
+        
+        return changes
+    
+    def _apply_payment_changes(self, payment: Payment, changes: Dict[str, Any]) -> Optional[Booking]:
+        """
+        Apply computed changes to a payment and its booking without saving
+        
+        Args:
+            payment: Payment model instance
+            changes: Field changes from _compute_payment_changes
+            
+        Returns:
+            The booking if its status changed, otherwise None
+        """
+        for field, value in changes.items():
+            setattr(payment, field, value)
+        
+        if payment.status == 'completed':
+            booking = payment.booking
+            booking.status = 'confirmed'
+            logger.info(f"Payment completed for booking {booking.booking_id}")
+            return booking
+        
+        if payment.status == 'failed':
+            booking = payment.booking
+            booking.status = 'payment_failed'
+            logger.warning(f"Payment failed for booking {booking.booking_id}")
+            return booking
+        
+        return None
+    
     def update_payment_status(self, payment: Payment, verification_data: Dict[str, Any]) -> None:
         """
         Update payment status based on verification response
@@ -156,46 +351,51 @@ class ChapaPaymentService:
             verification_data: Response from payment verification
         """
         try:
-            data = verification_data.get('data', {})
-            status = data.get('status', '').lower()
-            
-            # Map Chapa status to our payment status
-            status_mapping = {
-                'success': 'completed',
-                'failed': 'failed',
-                'pending': 'processing',
-                'cancelled': 'cancelled',
-            }
+            changes = self._compute_payment_changes(payment, verification_data)
+            booking = self._apply_payment_changes(payment, changes)
             
-            payment.status = status_mapping.get(status, 'failed')
-            payment.chapa_transaction_id = data.get('id')
-            payment.payment_method = self._get_payment_method(data.get('method'))
-            payment.webhook_data = verification_data
+            if booking is not None:
+                booking.save(update_fields=['status'])
             
-            if payment.status == 'completed':
-                payment.payment_date = data.get('created_at')
-                # Update booking status
-                booking = payment.booking
-                booking.status = 'confirmed'
-                booking.save()
-                
-                logger.info(f"Payment completed for booking {booking.booking_id}")
-                
-            elif payment.status == 'failed':
-                payment.failure_reason = data.get('failure_reason', 'Payment failed')
-                # Update booking status
-                booking = payment.booking
-                booking.status = 'payment_failed'
-                booking.save()
-                
-                logger.warning(f"Payment failed for booking {booking.booking_id}")
-            
-            payment.save()
+            payment.save(update_fields=list(changes))
             
         except Exception as e:
             logger.error(f"Error updating payment status: {str(e)}")
             raise
     
+    def update_payment_statuses_bulk(self, updates: List[Tuple[Payment, Dict[str, Any]]]) -> List[Payment]:
+        """
+        Update many payments from their verification responses in one batch
+        
+        Args:
+            updates: (payment, verification_data) pairs; payments should be
+                fetched with their booking to avoid one query per payment
+            
+        Returns:
+            The updated Payment instances
+        """
+        payments = []
+        bookings = []
+        fields = set()
+        
+        for payment, verification_data in updates:
+            changes = self._compute_payment_changes(payment, verification_data)
+            booking = self._apply_payment_changes(payment, changes)
+            if booking is not None:
+                bookings.append(booking)
+            payments.append(payment)
+            fields.update(changes)
+        
+        with transaction.atomic():
+            if payments:
+                Payment.objects.bulk_update(payments, sorted(fields))
+            if bookings:
+                Booking.objects.bulk_update(bookings, ['status'])
+        
+        cache.delete_many([Payment.status_cache_key(p.payment_id) for p in payments])
+        
+        return payments
+    
     def _get_payment_method(self, chapa_method: str) -> str:
         """
         Map Chapa payment method to our payment method choices
@@ -206,27 +406,35 @@ class ChapaPaymentService:
         Returns:
             Mapped payment method
         """
-        method_mapping = {
-            'telebirr': 'mobile',
-            'cbebirr': 'mobile',
-            'ebirr': 'mobile',
-            'mpesa': 'mobile',
-            'visa': 'card',
-            'mastercard': 'card',
-            'amex': 'card',
-            'bank': 'bank',
-        }
-        
         if chapa_method:
-            return method_mapping.get(chapa_method.lower(), 'mobile')
+            return _METHOD_MAP.get(chapa_method.lower(), 'mobile')
         return 'mobile'
     
-    def handle_webhook(self, webhook_data: Dict[str, Any]) -> Optional[Payment]:
+    def verify_webhook_signature(self, raw_body: bytes, signature: Optional[str]) -> bool:
+        """
+        Check a webhook body against its HMAC-SHA256 signature
+        
+        Args:
+            raw_body: Raw request body as received
+            signature: Hex digest sent by Chapa with the webhook
+            
+        Returns:
+            True if the signature matches the configured webhook secret
+        """
+        if not self.webhook_secret or not signature:
+            return False
+        
+        expected = hmac.new(self.webhook_secret.encode(), raw_body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+    
+    def handle_webhook(self, webhook_data: Dict[str, Any], signature_verified: bool = False) -> Optional[Payment]:
         """
         Handle webhook notification from Chapa
         
         Args:
             webhook_data: Webhook payload from Chapa
+            signature_verified: Whether the payload's signature was checked;
+                verified payloads are trusted without calling the verify API
             
         Returns:
             Updated Payment instance or None
@@ -244,18 +452,76 @@ class ChapaPaymentService:
                 logger.error(f"Payment not found for tx_ref: {tx_ref}")
                 return None
             
-            # Verify payment with Chapa API
-            verification_response = self.verify_payment(tx_ref)
+            if signature_verified:
+                # The payload is signed by Chapa, so use it as the verification
+                verification_response = {'data': webhook_data}
+            else:
+                # Verify payment with Chapa API
+                verification_response = self.verify_payment(tx_ref)
             
             # Update payment status
             self.update_payment_status(payment, verification_response)
             
             return payment
             
+        except ChapaConnectionError:
+            # Left to the caller, which can retry
+            raise
         except Exception as e:
             logger.error(f"Webhook handling error: {str(e)}")
             return None
     
+    def handle_webhooks_bulk(self, events: List[Dict[str, Any]], signature_verified: bool = False,
+                             max_workers: int = 10) -> List[Payment]:
+        """
+        Handle a batch of webhook notifications from Chapa
+        
+        Payments are loaded with one query, unsigned events are verified with
+        Chapa concurrently, and all changes are written with bulk updates.
+        
+        Args:
+            events: Webhook payloads from Chapa
+            signature_verified: Whether the batch's signature was checked
+            max_workers: Maximum number of concurrent verification requests
+            
+        Returns:
+            The updated Payment instances
+        """
+        # Later events for the same transaction supersede earlier ones
+        events_by_ref = {event['tx_ref']: event for event in events if event.get('tx_ref')}
+        payments = Payment.objects.select_related('booking').in_bulk(
+            list(events_by_ref), field_name='chapa_reference'
+        )
+        
+        missing = events_by_ref.keys() - payments.keys()
+        if missing:
+            logger.error(f"Payments not found for tx_refs: {sorted(missing)}")
+        
+        refs = [ref for ref in events_by_ref if ref in payments]
+        if not refs:
+            return []
+        
+        if signature_verified:
+            responses = [{'data': events_by_ref[ref]} for ref in refs]
+        else:
+            def verify(ref):
+                try:
+                    return self.verify_payment(ref)
+                except Exception as e:
+                    return e
+            
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(refs))) as executor:
+                responses = list(executor.map(verify, refs))
+        
+        updates = []
+        for ref, response in zip(refs, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Webhook verification failed for tx_ref {ref}: {str(response)}")
+                continue
+            updates.append((payments[ref], response))
+        
+        return self.update_payment_statuses_bulk(updates)
+    
     def get_payment_status(self, payment_id: str) -> Dict[str, Any]:
         """
         Get current payment status
@@ -266,22 +532,28 @@ class ChapaPaymentService:
         Returns:
             Payment status information
         """
+        cache_key = Payment.status_cache_key(payment_id)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             payment = Payment.objects.get(payment_id=payment_id)
             
-            # If payment is still processing, check with Chapa
-            if payment.status in ['pending', 'processing']:
+            # Only a payment initiated with Chapa can be verified there; a
+            # pending one is returned as stored until initiation finishes
+            if payment.status == 'processing':
                 verification_response = self.verify_payment(payment.chapa_reference)
                 self.update_payment_status(payment, verification_response)
                 payment.refresh_from_db()
             
-            return {
+            payment_status = {
                 'payment_id': str(payment.payment_id),
                 'status': payment.status,
                 'amount': float(payment.amount),
                 'currency': payment.currency,
                 'checkout_url': payment.chapa_checkout_url,
-                'booking_id': str(payment.booking.booking_id),
+                'booking_id': str(payment.booking_id),
                 'created_at': payment.created_at.isoformat(),
                 'updated_at': payment.updated_at.isoformat(),
             }
@@ -291,6 +563,32 @@ class ChapaPaymentService:
         except Exception as e:
             logger.error(f"Error getting payment status: {str(e)}")
             raise
+        
+        # Terminal states are cached for an hour; in-flight payments only
+        # briefly, so polling clients don't hit Chapa on every request
+        if payment.status in TERMINAL_PAYMENT_STATUSES:
+            cache.set(cache_key, payment_status, timeout=TERMINAL_STATUS_CACHE_TIMEOUT)
+        else:
+            cache.set(cache_key, payment_status, timeout=PENDING_STATUS_CACHE_TIMEOUT)
+        
+        return payment_status
+
+
+# Process-wide service instance, see get_chapa_service()
+_chapa_service = None
+
+
+def get_chapa_service() -> ChapaPaymentService:
+    """
+    Get the shared ChapaPaymentService, creating it on first use
+    
+    The service only holds settings and headers, and its HTTP connections
+    are pooled in _SESSION, so one instance serves every request.
+    """
+    global _chapa_service
+    if _chapa_service is None:
+        _chapa_service = ChapaPaymentService()
+    return _chapa_service
 
 
 # Utility function to create payment for booking
@@ -310,7 +608,7 @@ def create_payment_for_booking(booking: Booking, customer_phone: Optional[str] =
         amount=booking.total_price,
         currency='MAD',  # Default to Ethiopian Birr
         customer_email=booking.user.email,
-        customer_phone=customer_phone,
+        customer_phone=customer_phone or '',
         customer_name=f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
     )
     
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Avg, Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Listing, Booking, Review, Payment
+from .pagination import invalidate_counts
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_listing_review_stats(sender, instance, **kwargs):
+    """
+    Recompute the denormalized review statistics of the reviewed listing
+    """
+    stats = Review.objects.filter(listing_id=instance.listing_id).aggregate(
+        avg=Avg('rating'),
+        count=Count('review_id'),
+    )
+    Listing.objects.filter(pk=instance.listing_id).update(
+        avg_rating=round(stats['avg'] or 0, 2),
+        reviews_count=stats['count'],
+    )
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_listing_meta(sender, instance, **kwargs):
+    """
+    Drop the cached booking-validation fields of a changed listing
+    """
+    cache.delete(Listing.meta_cache_key(instance.listing_id))
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_payment_status(sender, instance, **kwargs):
+    """
+    Drop the cached status response of a changed payment
+    """
+    cache.delete(Payment.status_cache_key(instance.payment_id))
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_list_counts(sender, instance, **kwargs):
+    """
+    Drop the cached page counts of the changed model's lists
+    """
+    invalidate_counts(sender)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_version(sender, instance, update_fields=None, **kwargs):
+    """
+    Make the ETags of listing pages that nest users stale; a login only
+    touches last_login, which no page renders
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_counts(User)
@@ -1,94 +1,357 @@
-from celery import shared_task
-from django.core.mail import send_mail, EmailMessage
-from django.template.loader import render_to_string
+from celery import chord, group, shared_task
+from django.core.mail import get_connection, EmailMultiAlternatives
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
+from datetime import timedelta
+import functools
 import logging
+import smtplib
+import socket
+
+from .models import Booking, Listing, Payment
+from .services import ChapaConnectionError, get_chapa_service, create_payment_for_booking
 
 logger = logging.getLogger(__name__)
 
+# Compiled email templates by name; False marks a template that doesn't exist
+_TEMPLATE_CACHE = {}
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
-def send_booking_confirmation_email(self, booking_id):
+
+def _get_template(template_name):
     """
-    Send booking confirmation email to the customer
+    Return a compiled email template, loading it only once per worker
     
-    Args:
-        booking_id (str): UUID of the booking
-        
-    Returns:
-        dict: Status of email sending
+    Returns False if the template doesn't exist.
     """
-    try:
-        from .models import Booking
-        
-        # Get booking details
-        booking = Booking.objects.select_related('listing', 'user').get(booking_id=booking_id)
-        
-        # Email context
-        context = {
-            'booking': booking,
-            'customer_name': f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
-            'listing_name': booking.listing.name,
-            'location': booking.listing.location,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'number_of_guests': booking.number_of_guests,
-            'total_price': booking.total_price,
-            'booking_id': booking.booking_id,
-            'duration_nights': booking.duration_nights,
-            'current_year': timezone.now().year,
-        }
-        
-        # Email subject
-        subject = f'Booking Confirmation - {booking.listing.name}'
-        
-        # Email body (plain text)
-        message = f"""
-Dear {context['customer_name']},
+    template = _TEMPLATE_CACHE.get(template_name)
+    if template is None:
+        try:
+            template = get_template(template_name)
+        except TemplateDoesNotExist:
+            logger.warning(f"HTML template {template_name} not found, sending plain text emails")
+            template = False
+        _TEMPLATE_CACHE[template_name] = template
+    return template
+
+
+def _render_template(template_name, context):
+    """
+    Render an email template, loading and compiling it only once per worker
+    
+    Returns None if the template doesn't exist.
+    """
+    template = _get_template(template_name)
+    return template.render(context) if template else None
+
+
+# Plain-text email bodies, filled in with str.format_map
+CONFIRMATION_BODY = """
+Dear {customer_name},
 
 Your booking has been confirmed! Here are the details:
 
-Booking ID: {booking.booking_id}
-Property: {booking.listing.name}
-Location: {booking.listing.location}
-Check-in: {booking.check_in_date.strftime('%B %d, %Y')}
-Check-out: {booking.check_out_date.strftime('%B %d, %Y')}
-Guests: {booking.number_of_guests}
-Total Amount: ${booking.total_price}
+Booking ID: {booking_id}
+Property: {listing_name}
+Location: {location}
+Check-in: {check_in}
+Check-out: {check_out}
+Guests: {number_of_guests}
+Total Amount: ${total_price}
+
+Thank you for choosing ALX Travel App!
+
+Best regards,
+ALX Travel Team
+"""
+
+CANCELLATION_BODY = """
+Dear {customer_name},
+
+Your booking has been cancelled. Here are the details:
+
+Booking ID: {booking_id}
+Property: {listing_name}
+Location: {location}
+Check-in Date: {check_in}
+Check-out Date: {check_out}
+
+If you have any questions, please contact our support team.
+
+Best regards,
+ALX Travel Team
+"""
+
+PAYMENT_CONFIRMATION_BODY = """
+Dear {customer_name},
+
+Your payment has been successfully processed! Here are the details:
+
+Payment ID: {payment_id}
+Booking ID: {booking_id}
+Amount Paid: {amount} {currency}
+Payment Method: {payment_method}
+Payment Date: {payment_date}
+
+Property: {listing_name}
+Location: {location}
+
+Your booking is now confirmed!
 
 Thank you for choosing ALX Travel App!
 
 Best regards,
 ALX Travel Team
-        """
+"""
+
+HOST_NOTIFICATION_BODY = """
+Dear {host_name},
+
+You have received a new booking for your property! Here are the details:
+
+Booking ID: {booking_id}
+Property: {listing_name}
+Guest: {guest_name}
+Check-in: {check_in}
+Check-out: {check_out}
+Guests: {number_of_guests}
+Total Amount: ${total_price}
+
+Please ensure your property is ready for the guest's arrival.
+
+Best regards,
+ALX Travel Team
+"""
+
+REMINDER_BODY = """
+Dear {customer_name},
+
+This is a friendly reminder that your check-in is tomorrow!
+
+Booking Details:
+Booking ID: {booking_id}
+Property: {listing_name}
+Location: {location}
+Check-in: {check_in}
+Check-out: {check_out}
+
+Have a wonderful stay!
+
+Best regards,
+ALX Travel Team
+"""
+
+
+@functools.lru_cache(maxsize=4096)
+def _display_name(first_name, last_name, username):
+    """Full name of a user for email greetings, falling back to the username"""
+    return f"{first_name} {last_name}".strip() or username
+
+
+# English month names for email dates. Formatting by hand avoids
+# strftime's locale lookups and always gives English names.
+MONTHS = (
+    '', 'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December',
+)
+
+
+def _fmt_date(d):
+    """Format a date like strftime('%B %d, %Y')"""
+    return f'{MONTHS[d.month]} {d.day:02d}, {d.year}'
+
+
+def _fmt_datetime(d):
+    """Format a datetime like strftime('%B %d, %Y at %I:%M %p')"""
+    hour12 = (d.hour - 1) % 12 + 1
+    return f"{_fmt_date(d)} at {hour12:02d}:{d.minute:02d} {'PM' if d.hour >= 12 else 'AM'}"
+
+
+# Columns the email tasks read. The tasks only read, so they fetch flat
+# rows with .values() instead of building model instances; related
+# columns are keyed by their lookup path (e.g. 'listing__name').
+USER_NAME_FIELDS = ('email', 'first_name', 'last_name', 'username')
+
+# Customer emails about a booking (reminder, cancellation)
+BOOKING_EMAIL_FIELDS = (
+    'booking_id', 'check_in_date', 'check_out_date', 'listing__name', 'listing__location',
+) + tuple(f'user__{name}' for name in USER_NAME_FIELDS)
+
+# Booking confirmation email
+CONFIRMATION_EMAIL_FIELDS = BOOKING_EMAIL_FIELDS + ('number_of_guests', 'total_price', 'duration_nights')
+
+# Host notification email
+HOST_EMAIL_FIELDS = (
+    'booking_id', 'check_in_date', 'check_out_date', 'number_of_guests', 'total_price',
+    'duration_nights', 'listing__name',
+) + tuple(f'listing__host__{name}' for name in USER_NAME_FIELDS) + tuple(f'user__{name}' for name in USER_NAME_FIELDS)
+
+# Both new-booking emails (customer confirmation and host notification)
+BOOKING_CREATED_EMAIL_FIELDS = tuple(dict.fromkeys(CONFIRMATION_EMAIL_FIELDS + HOST_EMAIL_FIELDS))
+
+# Payment confirmation email
+PAYMENT_EMAIL_FIELDS = (
+    'payment_id', 'amount', 'currency', 'payment_method', 'payment_date',
+    'booking__booking_id', 'booking__listing__name', 'booking__listing__location',
+) + tuple(f'booking__user__{name}' for name in USER_NAME_FIELDS)
+
+# Labels for Payment.payment_method, as get_payment_method_display() gives
+_PAYMENT_METHOD_LABELS = dict(Payment.PAYMENT_METHOD)
+
+
+def _nested(row):
+    """
+    Re-key a flat .values() row into nested dicts
+    
+    Templates keep working with lookups like booking.listing.name.
+    """
+    nested = {}
+    for key, value in row.items():
+        *path, name = key.split('__')
+        target = nested
+        for part in path:
+            target = target.setdefault(part, {})
+        target[name] = value
+    return nested
+
+
+# Errors worth retrying an email send for. Anything else (refused
+# recipients, template errors, bad data) fails straight away.
+TRANSIENT_EMAIL_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    socket.timeout,
+    TimeoutError,
+    ConnectionResetError,
+)
+
+# How long a sent email is remembered, so a retried or redelivered task
+# doesn't send it again
+EMAIL_SENT_TIMEOUT = 86400
+
+
+def _email_sent_key(task, object_id):
+    # Retries and redeliveries keep the task ID, while each status change
+    # queues a new task, so a later confirmation or cancellation of the
+    # same booking is sent. Direct calls have no ID and dedupe per day.
+    delivery = task.request.id or timezone.localdate().isoformat()
+    return f'emailsent:{task.name}:{object_id}:{delivery}'
+
+
+def _claim_email(task, object_id):
+    """
+    Mark a task's email for an object as sent
+    
+    Returns False if it was already claimed, so the caller skips sending.
+    cache.add is atomic, so concurrent deliveries of the same task can't
+    both claim it.
+    """
+    return cache.add(_email_sent_key(task, object_id), 1, timeout=EMAIL_SENT_TIMEOUT)
+
+
+def _release_email(task, object_id):
+    """Forget a claim after a failed send, so the retry can send again"""
+    cache.delete(_email_sent_key(task, object_id))
+
+
+def build_confirmation_message(booking, connection=None):
+    """
+    Build the booking confirmation email for a booking's customer
+    
+    Args:
+        booking: Booking row from .values(*CONFIRMATION_EMAIL_FIELDS)
+        connection: Optional mail connection to send the message through
         
-        # Try to render HTML template if it exists
-        html_message = None
-        try:
-            html_message = render_to_string('emails/booking_confirmation.html', context)
-        except Exception as e:
-            logger.warning(f"HTML template not found, sending plain text email: {str(e)}")
+    Returns:
+        EmailMultiAlternatives: The confirmation, with an HTML alternative
+        if the template is available
+    """
+    # Email context
+    context = {
+        'booking': _nested(booking),
+        'customer_name': _display_name(booking['user__first_name'], booking['user__last_name'], booking['user__username']),
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in_date': booking['check_in_date'],
+        'check_out_date': booking['check_out_date'],
+        'number_of_guests': booking['number_of_guests'],
+        'total_price': booking['total_price'],
+        'booking_id': booking['booking_id'],
+        'duration_nights': booking['duration_nights'],
+        'current_year': timezone.now().year,
+    }
+    
+    # Email subject
+    subject = f"Booking Confirmation - {booking['listing__name']}"
+    
+    # Email body (plain text)
+    message = CONFIRMATION_BODY.format_map({
+        'customer_name': context['customer_name'],
+        'booking_id': booking['booking_id'],
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in': _fmt_date(booking['check_in_date']),
+        'check_out': _fmt_date(booking['check_out_date']),
+        'number_of_guests': booking['number_of_guests'],
+        'total_price': booking['total_price'],
+    })
+    
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking['user__email']],
+        connection=connection,
+    )
+    
+    # Attach the HTML version if the template exists (missing templates are
+    # remembered, so this is a dict lookup after the first miss)
+    html_message = _render_template('emails/booking_confirmation.html', context)
+    if html_message:
+        email.attach_alternative(html_message, 'text/html')
+    
+    return email
+
+
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
+def send_booking_confirmation_email(self, booking_id):
+    """
+    Send booking confirmation email to the customer
+    
+    Args:
+        booking_id (str): UUID of the booking
+        
+    Returns:
+        dict: Status of email sending
+    """
+    if not _claim_email(self, booking_id):
+        logger.info(f"Skipping send_booking_confirmation_email for {booking_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'booking_id': str(booking_id)
+        }
+    
+    try:
+        # Get booking details
+        booking = Booking.objects.values(*CONFIRMATION_EMAIL_FIELDS).get(booking_id=booking_id)
         
         # Send email
-        success = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        success = build_confirmation_message(booking).send(fail_silently=False)
         
         if success:
             logger.info(f"Booking confirmation email sent successfully for booking {booking_id}")
             return {
                 'status': 'success',
-                'message': f'Confirmation email sent to {booking.user.email}',
+                'message': f"Confirmation email sent to {booking['user__email']}",
                 'booking_id': str(booking_id)
             }
         else:
+            _release_email(self, booking_id)
             logger.error(f"Failed to send booking confirmation email for booking {booking_id}")
             return {
                 'status': 'failed',
@@ -98,6 +361,7 @@ ALX Travel Team
             
     except Booking.DoesNotExist:
         logger.error(f"Booking {booking_id} not found")
+        _release_email(self, booking_id)
         return {
             'status': 'failed',
             'message': f'Booking {booking_id} not found',
@@ -105,11 +369,65 @@ ALX Travel Team
         }
     except Exception as e:
         logger.error(f"Error sending booking confirmation email for {booking_id}: {str(e)}")
-        # Retry the task
-        raise self.retry(exc=e)
+        _release_email(self, booking_id)
+        raise
+
+
+def build_cancellation_message(booking, connection=None):
+    """
+    Build the booking cancellation email for a booking's customer
+    
+    Args:
+        booking: Booking row from .values(*BOOKING_EMAIL_FIELDS)
+        connection: Optional mail connection to send the message through
+        
+    Returns:
+        EmailMultiAlternatives: The cancellation notice, with an HTML
+        alternative if the template is available
+    """
+    # Email context
+    context = {
+        'booking': _nested(booking),
+        'customer_name': _display_name(booking['user__first_name'], booking['user__last_name'], booking['user__username']),
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in_date': booking['check_in_date'],
+        'check_out_date': booking['check_out_date'],
+        'booking_id': booking['booking_id'],
+        'current_year': timezone.now().year,
+    }
+    
+    # Email subject
+    subject = f"Booking Cancellation - {booking['listing__name']}"
+    
+    # Email body (plain text)
+    message = CANCELLATION_BODY.format_map({
+        'customer_name': context['customer_name'],
+        'booking_id': booking['booking_id'],
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in': _fmt_date(booking['check_in_date']),
+        'check_out': _fmt_date(booking['check_out_date']),
+    })
+    
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking['user__email']],
+        connection=connection,
+    )
+    
+    # Attach the HTML version if the template exists (missing templates are
+    # remembered, so this is a dict lookup after the first miss)
+    html_message = _render_template('emails/booking_cancellation.html', context)
+    if html_message:
+        email.attach_alternative(html_message, 'text/html')
+    
+    return email
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
 def send_booking_cancellation_email(self, booking_id):
     """
     Send booking cancellation email to the customer
@@ -120,70 +438,30 @@ def send_booking_cancellation_email(self, booking_id):
     Returns:
         dict: Status of email sending
     """
+    if not _claim_email(self, booking_id):
+        logger.info(f"Skipping send_booking_cancellation_email for {booking_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'booking_id': str(booking_id)
+        }
+    
     try:
-        from .models import Booking
-        
         # Get booking details
-        booking = Booking.objects.select_related('listing', 'user').get(booking_id=booking_id)
-        
-        # Email context
-        context = {
-            'booking': booking,
-            'customer_name': f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
-            'listing_name': booking.listing.name,
-            'location': booking.listing.location,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'booking_id': booking.booking_id,
-            'current_year': timezone.now().year,
-        }
-        
-        # Email subject
-        subject = f'Booking Cancellation - {booking.listing.name}'
-        
-        # Email body (plain text)
-        message = f"""
-Dear {context['customer_name']},
-
-Your booking has been cancelled. Here are the details:
-
-Booking ID: {booking.booking_id}
-Property: {booking.listing.name}
-Location: {booking.listing.location}
-Check-in Date: {booking.check_in_date.strftime('%B %d, %Y')}
-Check-out Date: {booking.check_out_date.strftime('%B %d, %Y')}
-
-If you have any questions, please contact our support team.
-
-Best regards,
-ALX Travel Team
-        """
-        
-        # Try to render HTML template if it exists
-        html_message = None
-        try:
-            html_message = render_to_string('emails/booking_cancellation.html', context)
-        except Exception as e:
-            logger.warning(f"HTML template not found, sending plain text email: {str(e)}")
+        booking = Booking.objects.values(*BOOKING_EMAIL_FIELDS).get(booking_id=booking_id)
         
         # Send email
-        success = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        success = build_cancellation_message(booking).send(fail_silently=False)
         
         if success:
             logger.info(f"Booking cancellation email sent successfully for booking {booking_id}")
             return {
                 'status': 'success',
-                'message': f'Cancellation email sent to {booking.user.email}',
+                'message': f"Cancellation email sent to {booking['user__email']}",
                 'booking_id': str(booking_id)
             }
         else:
+            _release_email(self, booking_id)
             logger.error(f"Failed to send booking cancellation email for booking {booking_id}")
             return {
                 'status': 'failed',
@@ -193,6 +471,7 @@ ALX Travel Team
             
     except Booking.DoesNotExist:
         logger.error(f"Booking {booking_id} not found")
+        _release_email(self, booking_id)
         return {
             'status': 'failed',
             'message': f'Booking {booking_id} not found',
@@ -200,10 +479,11 @@ ALX Travel Team
         }
     except Exception as e:
         logger.error(f"Error sending booking cancellation email for {booking_id}: {str(e)}")
-        raise self.retry(exc=e)
+        _release_email(self, booking_id)
+        raise
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
 def send_payment_confirmation_email(self, payment_id):
     """
     Send payment confirmation email to the customer
@@ -214,80 +494,78 @@ def send_payment_confirmation_email(self, payment_id):
     Returns:
         dict: Status of email sending
     """
+    if not _claim_email(self, payment_id):
+        logger.info(f"Skipping send_payment_confirmation_email for {payment_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'payment_id': str(payment_id)
+        }
+    
     try:
-        from .models import Payment
-        
         # Get payment details
-        payment = Payment.objects.select_related('booking', 'booking__listing', 'booking__user').get(payment_id=payment_id)
-        booking = payment.booking
+        payment = Payment.objects.values(*PAYMENT_EMAIL_FIELDS).get(payment_id=payment_id)
+        nested_payment = _nested(payment)
+        payment_method = payment['payment_method']
         
         # Email context
         context = {
-            'payment': payment,
-            'booking': booking,
-            'customer_name': f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
-            'listing_name': booking.listing.name,
-            'location': booking.listing.location,
-            'payment_id': payment.payment_id,
-            'booking_id': booking.booking_id,
-            'amount': payment.amount,
-            'currency': payment.currency,
-            'payment_method': payment.get_payment_method_display(),
-            'payment_date': payment.payment_date,
+            'payment': nested_payment,
+            'booking': nested_payment['booking'],
+            'customer_name': _display_name(
+                payment['booking__user__first_name'], payment['booking__user__last_name'], payment['booking__user__username']
+            ),
+            'listing_name': payment['booking__listing__name'],
+            'location': payment['booking__listing__location'],
+            'payment_id': payment['payment_id'],
+            'booking_id': payment['booking__booking_id'],
+            'amount': payment['amount'],
+            'currency': payment['currency'],
+            'payment_method': _PAYMENT_METHOD_LABELS.get(payment_method, payment_method),
+            'payment_date': payment['payment_date'],
             'current_year': timezone.now().year,
         }
         
         # Email subject
-        subject = f'Payment Confirmation - {booking.listing.name}'
+        subject = f"Payment Confirmation - {payment['booking__listing__name']}"
         
         # Email body (plain text)
-        message = f"""
-Dear {context['customer_name']},
-
-Your payment has been successfully processed! Here are the details:
-
-Payment ID: {payment.payment_id}
-Booking ID: {booking.booking_id}
-Amount Paid: {payment.amount} {payment.currency}
-Payment Method: {payment.get_payment_method_display() if hasattr(payment, 'get_payment_method_display') else payment.payment_method}
-Payment Date: {payment.payment_date.strftime('%B %d, %Y at %I:%M %p') if payment.payment_date else 'N/A'}
-
-Property: {booking.listing.name}
-Location: {booking.listing.location}
-
-Your booking is now confirmed!
-
-Thank you for choosing ALX Travel App!
-
-Best regards,
-ALX Travel Team
-        """
-        
-        # Try to render HTML template if it exists
-        html_message = None
-        try:
-            html_message = render_to_string('emails/payment_confirmation.html', context)
-        except Exception as e:
-            logger.warning(f"HTML template not found, sending plain text email: {str(e)}")
+        message = PAYMENT_CONFIRMATION_BODY.format_map({
+            'customer_name': context['customer_name'],
+            'payment_id': payment['payment_id'],
+            'booking_id': payment['booking__booking_id'],
+            'amount': payment['amount'],
+            'currency': payment['currency'],
+            'payment_method': context['payment_method'],
+            'payment_date': _fmt_datetime(payment['payment_date']) if payment['payment_date'] else 'N/A',
+            'listing_name': payment['booking__listing__name'],
+            'location': payment['booking__listing__location'],
+        })
         
-        # Send email
-        success = send_mail(
+        email = EmailMultiAlternatives(
             subject=subject,
-            message=message,
+            body=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=[payment['booking__user__email']],
         )
         
+        # Attach the HTML version if the template exists
+        html_message = _render_template('emails/payment_confirmation.html', context)
+        if html_message:
+            email.attach_alternative(html_message, 'text/html')
+        
+        # Send email
+        success = email.send(fail_silently=False)
+        
         if success:
             logger.info(f"Payment confirmation email sent successfully for payment {payment_id}")
             return {
                 'status': 'success',
-                'message': f'Payment confirmation email sent to {booking.user.email}',
+                'message': f"Payment confirmation email sent to {payment['booking__user__email']}",
                 'payment_id': str(payment_id)
             }
         else:
+            _release_email(self, payment_id)
             logger.error(f"Failed to send payment confirmation email for payment {payment_id}")
             return {
                 'status': 'failed',
@@ -297,6 +575,7 @@ ALX Travel Team
             
     except Payment.DoesNotExist:
         logger.error(f"Payment {payment_id} not found")
+        _release_email(self, payment_id)
         return {
             'status': 'failed',
             'message': f'Payment {payment_id} not found',
@@ -304,10 +583,70 @@ ALX Travel Team
         }
     except Exception as e:
         logger.error(f"Error sending payment confirmation email for {payment_id}: {str(e)}")
-        raise self.retry(exc=e)
+        _release_email(self, payment_id)
+        raise
+
+
+def build_host_notification_message(booking, connection=None):
+    """
+    Build the new-booking notification email for a listing's host
+    
+    Args:
+        booking: Booking row from .values(*HOST_EMAIL_FIELDS)
+        connection: Optional mail connection to send the message through
+        
+    Returns:
+        EmailMultiAlternatives: The notification, with an HTML alternative
+        if the template is available
+    """
+    # Email context
+    context = {
+        'booking': _nested(booking),
+        'host_name': _display_name(booking['listing__host__first_name'], booking['listing__host__last_name'], booking['listing__host__username']),
+        'guest_name': _display_name(booking['user__first_name'], booking['user__last_name'], booking['user__username']),
+        'listing_name': booking['listing__name'],
+        'check_in_date': booking['check_in_date'],
+        'check_out_date': booking['check_out_date'],
+        'number_of_guests': booking['number_of_guests'],
+        'total_price': booking['total_price'],
+        'booking_id': booking['booking_id'],
+        'duration_nights': booking['duration_nights'],
+        'current_year': timezone.now().year,
+    }
+    
+    # Email subject
+    subject = f"New Booking Received - {booking['listing__name']}"
+    
+    # Email body (plain text)
+    message = HOST_NOTIFICATION_BODY.format_map({
+        'host_name': context['host_name'],
+        'guest_name': context['guest_name'],
+        'booking_id': booking['booking_id'],
+        'listing_name': booking['listing__name'],
+        'check_in': _fmt_date(booking['check_in_date']),
+        'check_out': _fmt_date(booking['check_out_date']),
+        'number_of_guests': booking['number_of_guests'],
+        'total_price': booking['total_price'],
+    })
+    
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking['listing__host__email']],
+        connection=connection,
+    )
+    
+    # Attach the HTML version if the template exists (missing templates are
+    # remembered, so this is a dict lookup after the first miss)
+    html_message = _render_template('emails/host_notification.html', context)
+    if html_message:
+        email.attach_alternative(html_message, 'text/html')
+    
+    return email
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
 def send_host_notification_email(self, booking_id):
     """
     Send new booking notification email to the host
@@ -318,76 +657,30 @@ def send_host_notification_email(self, booking_id):
     Returns:
         dict: Status of email sending
     """
+    if not _claim_email(self, booking_id):
+        logger.info(f"Skipping send_host_notification_email for {booking_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'booking_id': str(booking_id)
+        }
+    
     try:
-        from .models import Booking
-        
         # Get booking details
-        booking = Booking.objects.select_related('listing', 'listing__host', 'user').get(booking_id=booking_id)
-        host = booking.listing.host
-        
-        # Email context
-        context = {
-            'booking': booking,
-            'host_name': f"{host.first_name} {host.last_name}".strip() or host.username,
-            'guest_name': f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
-            'listing_name': booking.listing.name,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'number_of_guests': booking.number_of_guests,
-            'total_price': booking.total_price,
-            'booking_id': booking.booking_id,
-            'duration_nights': booking.duration_nights,
-            'current_year': timezone.now().year,
-        }
-        
-        # Email subject
-        subject = f'New Booking Received - {booking.listing.name}'
-        
-        # Email body (plain text)
-        message = f"""
-Dear {context['host_name']},
-
-You have received a new booking for your property! Here are the details:
-
-Booking ID: {booking.booking_id}
-Property: {booking.listing.name}
-Guest: {context['guest_name']}
-Check-in: {booking.check_in_date.strftime('%B %d, %Y')}
-Check-out: {booking.check_out_date.strftime('%B %d, %Y')}
-Guests: {booking.number_of_guests}
-Total Amount: ${booking.total_price}
-
-Please ensure your property is ready for the guest's arrival.
-
-Best regards,
-ALX Travel Team
-        """
-        
-        # Try to render HTML template if it exists
-        html_message = None
-        try:
-            html_message = render_to_string('emails/host_notification.html', context)
-        except Exception as e:
-            logger.warning(f"HTML template not found, sending plain text email: {str(e)}")
+        booking = Booking.objects.values(*HOST_EMAIL_FIELDS).get(booking_id=booking_id)
         
         # Send email
-        success = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[host.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        success = build_host_notification_message(booking).send(fail_silently=False)
         
         if success:
             logger.info(f"Host notification email sent successfully for booking {booking_id}")
             return {
                 'status': 'success',
-                'message': f'Host notification email sent to {host.email}',
+                'message': f"Host notification email sent to {booking['listing__host__email']}",
                 'booking_id': str(booking_id)
             }
         else:
+            _release_email(self, booking_id)
             logger.error(f"Failed to send host notification email for booking {booking_id}")
             return {
                 'status': 'failed',
@@ -397,6 +690,7 @@ ALX Travel Team
             
     except Booking.DoesNotExist:
         logger.error(f"Booking {booking_id} not found")
+        _release_email(self, booking_id)
         return {
             'status': 'failed',
             'message': f'Booking {booking_id} not found',
@@ -404,7 +698,140 @@ ALX Travel Team
         }
     except Exception as e:
         logger.error(f"Error sending host notification email for {booking_id}: {str(e)}")
-        raise self.retry(exc=e)
+        _release_email(self, booking_id)
+        raise
+
+
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
+def send_booking_emails(self, booking_id):
+    """
+    Send the new-booking emails: confirmation to the customer and
+    notification to the host
+    
+    The booking is loaded once and both emails share one SMTP connection.
+    
+    Args:
+        booking_id (str): UUID of the booking
+        
+    Returns:
+        dict: Status of email sending
+    """
+    if not _claim_email(self, booking_id):
+        logger.info(f"Skipping send_booking_emails for {booking_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'booking_id': str(booking_id)
+        }
+    
+    try:
+        booking = Booking.objects.values(*BOOKING_CREATED_EMAIL_FIELDS).get(booking_id=booking_id)
+    except Booking.DoesNotExist:
+        logger.error(f"Booking {booking_id} not found")
+        _release_email(self, booking_id)
+        return {
+            'status': 'failed',
+            'message': f'Booking {booking_id} not found',
+            'booking_id': str(booking_id)
+        }
+    
+    try:
+        with get_connection() as connection:
+            sent = connection.send_messages([
+                build_confirmation_message(booking),
+                build_host_notification_message(booking),
+            ])
+    except Exception:
+        _release_email(self, booking_id)
+        raise
+    
+    logger.info(f"Sent {sent} booking emails for booking {booking_id}")
+    return {
+        'status': 'success',
+        'message': f'Sent {sent} booking emails',
+        'booking_id': str(booking_id)
+    }
+
+
+@shared_task
+def send_host_notifications_bulk(booking_ids):
+    """
+    Send new booking notification emails to hosts for several bookings
+    
+    Bookings are read in one query and their listings and hosts in a
+    second, so a listing or host shared by many bookings is fetched once
+    (what prefetch_related does for instances, done for .values() rows).
+    All emails go through one SMTP connection.
+    
+    Args:
+        booking_ids (list): UUIDs of the bookings
+        
+    Returns:
+        dict: Status of email sending
+    """
+    booking_fields = [field for field in HOST_EMAIL_FIELDS if not field.startswith('listing__')]
+    listing_fields = [field[len('listing__'):] for field in HOST_EMAIL_FIELDS if field.startswith('listing__')]
+    
+    bookings = list(Booking.objects.filter(booking_id__in=booking_ids).values('listing_id', *booking_fields))
+    listings = {
+        row.pop('listing_id'): row
+        for row in Listing.objects.filter(
+            listing_id__in={booking['listing_id'] for booking in bookings}
+        ).values('listing_id', *listing_fields)
+    }
+    
+    # Re-key the listing columns as the joined lookup paths the builder reads
+    for booking in bookings:
+        listing = listings[booking.pop('listing_id')]
+        booking.update((f'listing__{name}', value) for name, value in listing.items())
+    
+    count = 0
+    with get_connection() as connection:
+        for booking in bookings:
+            # One bad recipient must not abort the rest of the batch
+            try:
+                count += connection.send_messages([build_host_notification_message(booking)])
+            except Exception as e:
+                logger.error(f"Error sending host notification email for {booking['booking_id']}: {str(e)}")
+    
+    logger.info(f"Sent {count} host notification emails")
+    return {
+        'status': 'success',
+        'message': f'Sent {count} host notification emails'
+    }
+
+
+@shared_task
+def send_cancellation_emails_bulk(booking_ids):
+    """
+    Send booking cancellation emails for several bookings
+    
+    Args:
+        booking_ids (list): UUIDs of the cancelled bookings
+        
+    Returns:
+        dict: Status of email sending
+    """
+    bookings = Booking.objects.filter(booking_id__in=booking_ids).values(*BOOKING_EMAIL_FIELDS)
+    
+    count = 0
+    with get_connection() as connection:
+        for booking in bookings:
+            # One bad recipient must not abort the rest of the batch
+            try:
+                count += connection.send_messages([build_cancellation_message(booking)])
+            except Exception as e:
+                logger.error(f"Error sending booking cancellation email for {booking['booking_id']}: {str(e)}")
+    
+    logger.info(f"Sent {count} cancellation emails")
+    return {
+        'status': 'success',
+        'message': f'Sent {count} cancellation emails'
+    }
+
+
+# Bookings cancelled per transaction by cleanup_expired_bookings
+CLEANUP_BATCH_SIZE = 1000
 
 
 @shared_task
@@ -414,9 +841,6 @@ def cleanup_expired_bookings():
     This can be used with Celery Beat for scheduled execution
     """
     try:
-        from .models import Booking
-        from datetime import timedelta
-        
         # Find bookings that are pending for more than 24 hours
         cutoff_time = timezone.now() - timedelta(hours=24)
         expired_bookings = Booking.objects.filter(
@@ -424,8 +848,21 @@ def cleanup_expired_bookings():
             created_at__lt=cutoff_time
         )
         
-        count = expired_bookings.count()
-        expired_bookings.update(status='cancelled')
+        # Cancel in short batches so no transaction holds many row locks.
+        # Each batch locks and collects its IDs, then cancels exactly those
+        # bookings; cancelled rows drop out of the filter for the next batch.
+        count = 0
+        while True:
+            with transaction.atomic():
+                booking_ids = list(
+                    expired_bookings.select_for_update().values_list('booking_id', flat=True)[:CLEANUP_BATCH_SIZE]
+                )
+                if not booking_ids:
+                    break
+                Booking.objects.filter(booking_id__in=booking_ids).update(status='cancelled')
+            
+            count += len(booking_ids)
+            send_cancellation_emails_bulk.delay([str(booking_id) for booking_id in booking_ids])
         
         logger.info(f"Cleaned up {count} expired bookings")
         return {
@@ -441,28 +878,99 @@ def cleanup_expired_bookings():
         }
 
 
+def build_reminder_message(booking, connection=None, html_template=None):
+    """
+    Build the check-in reminder email for a booking
+    
+    Args:
+        booking: Booking row from .values(*BOOKING_EMAIL_FIELDS)
+        connection: Optional mail connection to send the message through
+        html_template: Reminder template already resolved by a batch caller
+            (False if missing); looked up when not given
+        
+    Returns:
+        EmailMultiAlternatives: The reminder, with an HTML alternative if
+        the template is available
+    """
+    # Email context
+    context = {
+        'booking': _nested(booking),
+        'customer_name': _display_name(booking['user__first_name'], booking['user__last_name'], booking['user__username']),
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in_date': booking['check_in_date'],
+        'check_out_date': booking['check_out_date'],
+        'booking_id': booking['booking_id'],
+        'current_year': timezone.now().year,
+    }
+    
+    # Email subject
+    subject = f"Check-in Reminder - {booking['listing__name']}"
+    
+    # Email body (plain text)
+    message = REMINDER_BODY.format_map({
+        'customer_name': context['customer_name'],
+        'booking_id': booking['booking_id'],
+        'listing_name': booking['listing__name'],
+        'location': booking['listing__location'],
+        'check_in': _fmt_date(booking['check_in_date']),
+        'check_out': _fmt_date(booking['check_out_date']),
+    })
+    
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[booking['user__email']],
+        connection=connection,
+    )
+    
+    # Attach the HTML version if the template exists
+    if html_template is None:
+        html_template = _get_template('emails/booking_reminder.html')
+    if html_template:
+        email.attach_alternative(html_template.render(context), 'text/html')
+    
+    return email
+
+
+def _send_reminders_bulk(bookings):
+    """
+    Send reminder emails for booking rows over one connection
+    
+    Returns the number of emails sent.
+    """
+    # Resolve the HTML template once for the whole batch
+    html_template = _get_template('emails/booking_reminder.html')
+    
+    count = 0
+    with get_connection() as connection:
+        for booking in bookings:
+            # One bad recipient must not abort the rest of the batch
+            try:
+                count += connection.send_messages([build_reminder_message(booking, html_template=html_template)])
+            except Exception as e:
+                logger.error(f"Error sending booking reminder email for {booking['booking_id']}: {str(e)}")
+    return count
+
+
 @shared_task
 def send_reminder_emails():
     """
     Periodic task to send reminder emails for upcoming check-ins
     This can be used with Celery Beat for scheduled execution
+    
+    All reminders are sent through a single SMTP connection.
     """
     try:
-        from .models import Booking
-        from datetime import timedelta
-        
         # Find bookings with check-in tomorrow
         tomorrow = timezone.now().date() + timedelta(days=1)
         upcoming_bookings = Booking.objects.filter(
             status='confirmed',
             check_in_date=tomorrow
-        ).select_related('listing', 'user')
+        ).values(*BOOKING_EMAIL_FIELDS)
         
-        count = 0
-        for booking in upcoming_bookings:
-            # Send reminder email (you can create a separate task for this)
-            send_booking_reminder_email.delay(str(booking.booking_id))
-            count += 1
+        count = _send_reminders_bulk(upcoming_bookings)
         
         logger.info(f"Sent {count} reminder emails")
         return {
@@ -478,7 +986,7 @@ def send_reminder_emails():
         }
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+@shared_task(bind=True, autoretry_for=TRANSIENT_EMAIL_ERRORS, retry_kwargs={'max_retries': 3, 'countdown': 60})
 def send_booking_reminder_email(self, booking_id):
     """
     Send booking reminder email to the customer (day before check-in)
@@ -489,71 +997,30 @@ def send_booking_reminder_email(self, booking_id):
     Returns:
         dict: Status of email sending
     """
+    if not _claim_email(self, booking_id):
+        logger.info(f"Skipping send_booking_reminder_email for {booking_id}: already sent")
+        return {
+            'status': 'skipped',
+            'message': 'Email already sent',
+            'booking_id': str(booking_id)
+        }
+    
     try:
-        from .models import Booking
-        
         # Get booking details
-        booking = Booking.objects.select_related('listing', 'user').get(booking_id=booking_id)
-        
-        # Email context
-        context = {
-            'booking': booking,
-            'customer_name': f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username,
-            'listing_name': booking.listing.name,
-            'location': booking.listing.location,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'booking_id': booking.booking_id,
-            'current_year': timezone.now().year,
-        }
-        
-        # Email subject
-        subject = f'Check-in Reminder - {booking.listing.name}'
-        
-        # Email body (plain text)
-        message = f"""
-Dear {context['customer_name']},
-
-This is a friendly reminder that your check-in is tomorrow!
-
-Booking Details:
-Booking ID: {booking.booking_id}
-Property: {booking.listing.name}
-Location: {booking.listing.location}
-Check-in: {booking.check_in_date.strftime('%B %d, %Y')}
-Check-out: {booking.check_out_date.strftime('%B %d, %Y')}
-
-Have a wonderful stay!
-
-Best regards,
-ALX Travel Team
-        """
-        
-        # Try to render HTML template if it exists
-        html_message = None
-        try:
-            html_message = render_to_string('emails/booking_reminder.html', context)
-        except Exception as e:
-            logger.warning(f"HTML template not found, sending plain text email: {str(e)}")
+        booking = Booking.objects.values(*BOOKING_EMAIL_FIELDS).get(booking_id=booking_id)
         
         # Send email
-        success = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        success = build_reminder_message(booking).send(fail_silently=False)
         
         if success:
             logger.info(f"Booking reminder email sent successfully for booking {booking_id}")
             return {
                 'status': 'success',
-                'message': f'Reminder email sent to {booking.user.email}',
+                'message': f"Reminder email sent to {booking['user__email']}",
                 'booking_id': str(booking_id)
             }
         else:
+            _release_email(self, booking_id)
             logger.error(f"Failed to send booking reminder email for booking {booking_id}")
             return {
                 'status': 'failed',
@@ -563,6 +1030,7 @@ ALX Travel Team
             
     except Booking.DoesNotExist:
         logger.error(f"Booking {booking_id} not found")
+        _release_email(self, booking_id)
         return {
             'status': 'failed',
             'message': f'Booking {booking_id} not found',
@@ -570,4 +1038,179 @@ ALX Travel Team
         }
     except Exception as e:
         logger.error(f"Error sending booking reminder email for {booking_id}: {str(e)}")
-        raise self.retry(exc=e)
\ No newline at end of file
+        _release_email(self, booking_id)
+        raise
+
+
+# Single-booking email tasks by kind, for send_all_for_booking
+BOOKING_EMAIL_TASKS = {
+    'confirm': send_booking_confirmation_email,
+    'cancel': send_booking_cancellation_email,
+    'host': send_host_notification_email,
+    'reminder': send_booking_reminder_email,
+}
+
+
+@shared_task
+def collect_email_results(results):
+    """
+    Combine the results of email tasks run in parallel
+    
+    Args:
+        results (list): Status dicts returned by the email tasks
+        
+    Returns:
+        dict: Overall status of email sending
+    """
+    sent = sum(1 for result in results if result.get('status') == 'success')
+    return {
+        'status': 'success' if sent == len(results) else 'failed',
+        'message': f'Sent {sent} of {len(results)} emails',
+        'results': results
+    }
+
+
+def send_all_for_booking(booking_id, kinds=('confirm', 'host')):
+    """
+    Queue several emails about one booking so workers send them in parallel
+    
+    Args:
+        booking_id (str): UUID of the booking
+        kinds (iterable): Keys of BOOKING_EMAIL_TASKS to send
+        
+    Returns:
+        AsyncResult: Result of collect_email_results once all emails are done
+    """
+    return chord(
+        BOOKING_EMAIL_TASKS[kind].s(str(booking_id)) for kind in kinds
+    )(collect_email_results.s())
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=2)
+def create_and_initiate_payment(self, booking_id, customer_phone=None):
+    """
+    Create the payment record for a booking and initiate it with Chapa
+    
+    Runs after the booking is committed so the booking request never waits
+    on the Chapa API. Clients poll the booking's payment_status endpoint
+    for the checkout URL. If Chapa can't be reached the task is retried
+    with backoff before the booking is marked as failed.
+    
+    Args:
+        booking_id (str): UUID of the booking
+        customer_phone (str): Optional customer phone number
+        
+    Returns:
+        dict: Status of payment initiation
+    """
+    try:
+        booking = Booking.objects.select_related('listing', 'user').get(booking_id=booking_id)
+    except Booking.DoesNotExist:
+        logger.error(f"Booking {booking_id} not found")
+        return {
+            'status': 'failed',
+            'message': f'Booking {booking_id} not found',
+            'booking_id': str(booking_id)
+        }
+    
+    try:
+        payment = booking.payment
+    except Payment.DoesNotExist:
+        payment = create_payment_for_booking(booking, customer_phone)
+    
+    # A redelivered task must not initiate the same payment twice; a
+    # connection failure leaves the payment pending for the retry
+    if payment.status != 'pending':
+        return {
+            'status': 'skipped',
+            'message': f'Payment already {payment.status}',
+            'booking_id': str(booking_id)
+        }
+    
+    try:
+        get_chapa_service().initiate_payment(payment)
+    except Exception as e:
+        # Connection failures are retried with exponential backoff first
+        if isinstance(e, ChapaConnectionError) and self.request.retries < self.max_retries:
+            logger.warning(f"Chapa unreachable for booking {booking_id}, retrying: {str(e)}")
+            raise self.retry(exc=e, countdown=self.default_retry_delay * 2 ** self.request.retries)
+        
+        # Out of retries; initiate_payment left the payment pending
+        if isinstance(e, ChapaConnectionError):
+            payment.status = 'failed'
+            payment.failure_reason = str(e)
+            payment.save(update_fields=['status', 'failure_reason'])
+        
+        booking.status = 'payment_failed'
+        booking.save(update_fields=['status'])
+        
+        logger.error(f"Payment initiation failed for booking {booking_id}: {str(e)}")
+        return {
+            'status': 'failed',
+            'message': str(e),
+            'booking_id': str(booking_id)
+        }
+    
+    logger.info(f"Payment initiated for booking {booking_id}")
+    return {
+        'status': 'success',
+        'message': 'Payment initiated',
+        'booking_id': str(booking_id),
+        'payment_id': str(payment.payment_id)
+    }
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5, default_retry_delay=2)
+def process_chapa_webhook(self, webhook_data, signature_verified=False):
+    """
+    Apply a Chapa webhook notification and queue confirmation emails
+    
+    The webhook view only checks the signature and queues this task, so
+    Chapa gets its response without waiting on the database or the verify
+    API. The task is acknowledged after it finishes so a lost worker
+    doesn't drop the notification. Unsigned events are verified with
+    Chapa, and are retried with backoff if Chapa can't be reached.
+    
+    Args:
+        webhook_data (dict or list): Webhook payload, or a batch of them
+        signature_verified (bool): Whether the payload's signature was checked
+        
+    Returns:
+        dict: Status of webhook processing
+    """
+    chapa_service = get_chapa_service()
+    
+    try:
+        # Batched notifications are processed together
+        if isinstance(webhook_data, list):
+            payments = chapa_service.handle_webhooks_bulk(webhook_data, signature_verified=signature_verified)
+        else:
+            payment = chapa_service.handle_webhook(webhook_data, signature_verified=signature_verified)
+            payments = [payment] if payment else []
+    except ChapaConnectionError as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Chapa unreachable while verifying webhook, retrying: {str(e)}")
+            raise self.retry(exc=e, countdown=self.default_retry_delay * 2 ** self.request.retries)
+        raise
+    
+    if not payments:
+        logger.warning("Webhook processing failed - payment not found or error occurred")
+        return {
+            'status': 'failed',
+            'message': 'No payment updated',
+        }
+    
+    # Queue all confirmation emails through one producer
+    confirmations = [
+        send_payment_confirmation_email.s(str(payment.payment_id))
+        for payment in payments if payment.is_successful
+    ]
+    if confirmations:
+        group(confirmations).apply_async()
+    
+    logger.info(f"Webhook processed: {len(payments)} payments updated")
+    return {
+        'status': 'success',
+        'message': f'Updated {len(payments)} payments',
+        'payment_ids': [str(payment.payment_id) for payment in payments]
+    }
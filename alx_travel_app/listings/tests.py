@@ -1,8 +1,20 @@
-from django.test import TestCase
+from celery.exceptions import Retry
+from kombu.exceptions import OperationalError
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.db import IntegrityError
 from django.contrib.auth.models import User
 from decimal import Decimal
 from datetime import date, timedelta
-from .models import Listing, Booking, Review
+from unittest import mock
+import requests
+import smtplib
+import time
+from .models import Listing, Booking, Review, Payment
+from .services import ChapaPaymentService
+from .tasks import create_and_initiate_payment, send_booking_confirmation_email
 
 
 class ListingModelTest(TestCase):
@@ -29,6 +41,53 @@ class ListingModelTest(TestCase):
         self.assertEqual(listing.host, self.user)
         self.assertTrue(listing.available)
 
+    def test_amenities_are_normalized_on_save(self):
+        listing = Listing.objects.create(
+            host=self.user,
+            name='Test Apartment',
+            description='A nice test apartment',
+            location='Test City',
+            price_per_night=Decimal('100.00'),
+            amenities=' WiFi ,Pool,, Kitchen '
+        )
+        self.assertEqual(listing.amenities, 'WiFi, Pool, Kitchen')
+
+    def test_search_matches_words_across_fields(self):
+        listing = Listing.objects.create(
+            host=self.user,
+            name='Beach House',
+            description='Steps from the sea',
+            location='Test City',
+            price_per_night=Decimal('100.00'),
+            amenities='WiFi, Pool'
+        )
+        Listing.objects.create(
+            host=self.user,
+            name='City Flat',
+            description='Downtown apartment',
+            location='Test City',
+            price_per_night=Decimal('80.00')
+        )
+        self.assertEqual(list(Listing.objects.search('beach pool')), [listing])
+        self.assertEqual(list(Listing.objects.search('mountain')), [])
+
+    def test_save_refreshes_updated_at(self):
+        Listing.objects.create(
+            host=self.user,
+            name='Test Apartment',
+            description='A nice test apartment',
+            location='Test City',
+            price_per_night=Decimal('100.00')
+        )
+        # A full save of a loaded row writes its updated_at back unchanged
+        listing = Listing.objects.get(name='Test Apartment')
+        created = listing.updated_at
+        time.sleep(0.01)
+        listing.name = 'Renamed Apartment'
+        listing.save()
+        listing.refresh_from_db()
+        self.assertGreater(listing.updated_at, created)
+
 
 class BookingModelTest(TestCase):
     def setUp(self):
@@ -64,6 +123,25 @@ class BookingModelTest(TestCase):
         self.assertEqual(booking.user, self.guest)
         self.assertEqual(booking.duration_nights, 2)
 
+    def test_overlapping_bookings_are_rejected(self):
+        Booking.objects.create(
+            listing=self.listing,
+            user=self.guest,
+            check_in_date=date.today() + timedelta(days=1),
+            check_out_date=date.today() + timedelta(days=3),
+            number_of_guests=2,
+            total_price=Decimal('200.00')
+        )
+        with self.assertRaises(IntegrityError):
+            Booking.objects.create(
+                listing=self.listing,
+                user=self.guest,
+                check_in_date=date.today() + timedelta(days=2),
+                check_out_date=date.today() + timedelta(days=4),
+                number_of_guests=2,
+                total_price=Decimal('200.00')
+            )
+
 
 class ReviewModelTest(TestCase):
     def setUp(self):
@@ -95,4 +173,299 @@ class ReviewModelTest(TestCase):
         )
         self.assertEqual(review.listing, self.listing)
         self.assertEqual(review.user, self.guest)
-        self.assertEqual(review.rating, 5)
\ No newline at end of file
+        self.assertEqual(review.rating, 5)
+
+    def test_review_updates_listing_stats(self):
+        Review.objects.create(
+            listing=self.listing,
+            user=self.guest,
+            rating=4,
+            comment='Nice place'
+        )
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.total_reviews, 1)
+        self.assertEqual(self.listing.average_rating, Decimal('4.00'))
+
+
+class ListingApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testhost',
+            email='host@test.com',
+            password='testpass123'
+        )
+        self.listing = Listing.objects.create(
+            host=self.user,
+            name='Test Apartment',
+            description='A nice test apartment',
+            location='Test City',
+            price_per_night=Decimal('100.00')
+        )
+        self.url = f'/api/listings/{self.listing.listing_id}/'
+
+    def test_unchanged_listing_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_conditional_get_after_patch_returns_new_listing(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'name': 'Renamed Apartment'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Renamed Apartment')
+
+    def test_reviews_etag_changes_with_nested_listing_and_reviewer(self):
+        Review.objects.create(listing=self.listing, user=self.user, rating=5, comment='Great')
+        reviews_url = f'{self.url}reviews/'
+        etag = self.client.get(reviews_url)['ETag']
+        
+        self.listing.name = 'Renamed Apartment'
+        self.listing.save()
+        response = self.client.get(reviews_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        etag = response['ETag']
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self.client.get(reviews_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['user']['first_name'], 'Renamed')
+
+
+class BookingApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(
+            username='testhost',
+            email='host@test.com',
+            password='testpass123'
+        )
+        self.guest = User.objects.create_user(
+            username='testguest',
+            email='guest@test.com',
+            password='testpass123'
+        )
+        self.listing = Listing.objects.create(
+            host=self.host,
+            name='Test Apartment',
+            description='A nice test apartment',
+            location='Test City',
+            price_per_night=Decimal('100.00'),
+            max_guests=4
+        )
+        
+    def create_booking(self, start, nights=2, status='pending'):
+        return Booking.objects.create(
+            listing=self.listing,
+            user=self.guest,
+            check_in_date=date.today() + timedelta(days=start),
+            check_out_date=date.today() + timedelta(days=start + nights),
+            number_of_guests=2,
+            total_price=Decimal('100.00') * nights,
+            status=status
+        )
+
+    def test_reactivating_overlapping_booking_is_rejected(self):
+        cancelled = self.create_booking(1, status='cancelled')
+        self.create_booking(2)
+        response = self.client.patch(
+            f'/api/bookings/{cancelled.booking_id}/update_status/',
+            {'status': 'confirmed'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+    def test_create_survives_broker_outage_after_commit(self):
+        with mock.patch('listings.serializers.create_and_initiate_payment') as payment_task, \
+                mock.patch('listings.views.send_booking_emails') as email_task, \
+                self.captureOnCommitCallbacks(execute=True):
+            payment_task.delay.side_effect = OperationalError('Broker unavailable')
+            response = self.client.post(
+                '/api/bookings/',
+                {
+                    'listing_id': str(self.listing.listing_id),
+                    'user_id': self.guest.id,
+                    'check_in_date': str(date.today() + timedelta(days=1)),
+                    'check_out_date': str(date.today() + timedelta(days=3)),
+                    'number_of_guests': 2,
+                    'total_price': '200.00',
+                },
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 201)
+        payment_task.delay.assert_called_once()
+        # Callbacks registered after the failing one still run
+        email_task.delay.assert_called_once()
+
+    def test_cancel_survives_broker_outage_after_commit(self):
+        booking = self.create_booking(1)
+        with mock.patch('listings.views.send_booking_cancellation_email') as email_task, \
+                self.captureOnCommitCallbacks(execute=True):
+            email_task.delay.side_effect = OperationalError('Broker unavailable')
+            response = self.client.post(f'/api/bookings/{booking.booking_id}/cancel/')
+        
+        self.assertEqual(response.status_code, 200)
+        email_task.delay.assert_called_once()
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+
+    @override_settings(CHAPA_SECRET_KEY='test-key')
+    def test_payment_status_of_uninitiated_payment_skips_chapa(self):
+        booking = self.create_booking(1, status='payment_pending')
+        Payment.objects.create(
+            booking=booking,
+            amount=booking.total_price,
+            customer_email=self.guest.email,
+            customer_name='Test Guest'
+        )
+        with mock.patch('listings.views.get_chapa_service', return_value=ChapaPaymentService()), \
+                mock.patch.object(ChapaPaymentService, 'verify_payment') as verify:
+            response = self.client.get(f'/api/bookings/{booking.booking_id}/payment_status/')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'pending')
+        verify.assert_not_called()
+
+    @override_settings(CHAPA_SECRET_KEY='test-key')
+    def test_payment_status_is_refreshed_after_payment_save(self):
+        booking = self.create_booking(1, status='payment_failed')
+        payment = Payment.objects.create(
+            booking=booking,
+            amount=booking.total_price,
+            customer_email=self.guest.email,
+            customer_name='Test Guest',
+            status='failed'
+        )
+        url = f'/api/bookings/{booking.booking_id}/payment_status/'
+        with mock.patch('listings.views.get_chapa_service', return_value=ChapaPaymentService()):
+            self.assertEqual(self.client.get(url).json()['status'], 'failed')
+            payment.status = 'completed'
+            payment.save(update_fields=['status'])
+            self.assertEqual(self.client.get(url).json()['status'], 'completed')
+
+    @override_settings(CHAPA_SECRET_KEY='test-key')
+    def test_payment_stays_pending_while_initiation_is_retried(self):
+        booking = self.create_booking(1, status='payment_pending')
+        booking_id = str(booking.booking_id)
+        with mock.patch('listings.tasks.get_chapa_service', return_value=ChapaPaymentService()), \
+                mock.patch('listings.services._SESSION.post', side_effect=requests.exceptions.ConnectionError('refused')):
+            with self.assertRaises(Retry):
+                create_and_initiate_payment.apply(args=[booking_id], task_id='initiate-1')
+            self.assertEqual(Payment.objects.get(booking=booking).status, 'pending')
+            
+            # The last retry gives up and marks the payment failed
+            result = create_and_initiate_payment.apply(
+                args=[booking_id],
+                task_id='initiate-1',
+                retries=create_and_initiate_payment.max_retries
+            )
+        
+        self.assertEqual(result.get()['status'], 'failed')
+        self.assertEqual(Payment.objects.get(booking=booking).status, 'failed')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'payment_failed')
+
+    def test_bulk_update_status_confirms_and_notifies_changed_bookings(self):
+        first = self.create_booking(1)
+        second = self.create_booking(5)
+        confirmed = self.create_booking(10, status='confirmed')
+        ids = [str(b.booking_id) for b in (first, second, confirmed)]
+        
+        with mock.patch('listings.views.group') as group, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/bookings/bulk_update_status/',
+                {'booking_ids': ids, 'status': 'confirmed'},
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(set(response.json()['booking_ids']), set(ids[:2]))
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 3)
+        # One confirmation email per changed booking, queued as one group
+        signatures = list(group.call_args.args[0])
+        self.assertEqual({sig.args[0] for sig in signatures}, set(ids[:2]))
+        self.assertTrue(all(sig.task == 'listings.tasks.send_booking_confirmation_email' for sig in signatures))
+        group.return_value.apply_async.assert_called_once_with()
+
+    def test_bulk_update_status_rejects_overlapping_bookings(self):
+        first = self.create_booking(1, status='cancelled')
+        second = self.create_booking(2, status='cancelled')
+        
+        with mock.patch('listings.views.group') as group:
+            response = self.client.post(
+                '/api/bookings/bulk_update_status/',
+                {'booking_ids': [str(first.booking_id), str(second.booking_id)], 'status': 'confirmed'},
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.filter(status='confirmed').exists())
+        group.assert_not_called()
+
+
+class BookingEmailTaskTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        host = User.objects.create_user(
+            username='testhost',
+            email='host@test.com',
+            password='testpass123'
+        )
+        guest = User.objects.create_user(
+            username='testguest',
+            email='guest@test.com',
+            password='testpass123'
+        )
+        listing = Listing.objects.create(
+            host=host,
+            name='Test Apartment',
+            description='A nice test apartment',
+            location='Test City',
+            price_per_night=Decimal('100.00'),
+            max_guests=4
+        )
+        self.booking = Booking.objects.create(
+            listing=listing,
+            user=guest,
+            check_in_date=date.today() + timedelta(days=1),
+            check_out_date=date.today() + timedelta(days=3),
+            number_of_guests=2,
+            total_price=Decimal('200.00')
+        )
+        self.booking_id = str(self.booking.booking_id)
+        
+    def test_retry_after_smtp_failure_sends_once(self):
+        send_messages = EmailBackend.send_messages
+        attempts = []
+        
+        def flaky_send(backend, messages):
+            attempts.append(messages)
+            if len(attempts) == 1:
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            return send_messages(backend, messages)
+        
+        with mock.patch.object(EmailBackend, 'send_messages', flaky_send):
+            with self.assertRaises(Retry):
+                send_booking_confirmation_email.apply(args=[self.booking_id], task_id='delivery-1')
+            # The worker runs the retry under the same task ID
+            result = send_booking_confirmation_email.apply(args=[self.booking_id], task_id='delivery-1', retries=1)
+            # The broker redelivers the task after it succeeded
+            redelivered = send_booking_confirmation_email.apply(args=[self.booking_id], task_id='delivery-1')
+        
+        self.assertEqual(result.get()['status'], 'success')
+        self.assertEqual(redelivered.get()['status'], 'skipped')
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_new_task_for_same_booking_sends_again(self):
+        send_booking_confirmation_email.apply(args=[self.booking_id], task_id='confirm-1')
+        send_booking_confirmation_email.apply(args=[self.booking_id], task_id='confirm-2')
+        self.assertEqual(len(mail.outbox), 2)
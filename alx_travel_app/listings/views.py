@@ -1,88 +1,196 @@
+from celery import group
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Q
+from django_filters.rest_framework import DjangoFilterBackend
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
+from django.core.cache import cache
+from functools import wraps
+import hashlib
 import json
 import logging
 
+from .filters import ListingFilter, BookingFilter, ReviewFilter, PaymentFilter
 from .models import Listing, Booking, Review, Payment
+from .pagination import count_cache_version, invalidate_counts
 from .serializers import (
-    ListingSerializer, BookingSerializer, ReviewSerializer, PaymentSerializer,
-    BookingCreateResponseSerializer, PaymentStatusSerializer, 
+    UserSerializer, ListingSerializer, ListingListSerializer, BookingSerializer,
+    ReviewSerializer, ReviewListSerializer, PaymentSerializer,
+    BookingCreateResponseSerializer, BookingBulkStatusSerializer, PaymentStatusSerializer, 
     PaymentInitiateSerializer, PaymentVerifySerializer
 )
-from .services import ChapaPaymentService, create_payment_for_booking
+from .services import get_chapa_service, create_payment_for_booking
 from .tasks import (
     send_booking_confirmation_email, 
     send_booking_cancellation_email, 
     send_payment_confirmation_email,
-    send_host_notification_email
+    send_booking_emails,
+    process_chapa_webhook
 )
 
 logger = logging.getLogger(__name__)
 
+# User columns UserSerializer doesn't render (password hash, flags, dates);
+# querysets defer them on every joined user
+UNRENDERED_USER_FIELDS = tuple(
+    field.name for field in User._meta.concrete_fields
+    if field.name not in UserSerializer.Meta.fields
+)
+
+
+def _user_defers(*paths):
+    """Deferred-field names for the unrendered columns of the users at paths"""
+    return [f'{path}__{name}' for path in paths for name in UNRENDERED_USER_FIELDS]
+
+
+# Statuses update_status accepts
+VALID_BOOKING_STATUSES = frozenset(value for value, _ in Booking.BOOKING_STATUS)
+
+# Seconds an anonymous listing page is cached
+LISTING_PAGE_CACHE_TIMEOUT = 60
+
+
+def _listing_pages_version():
+    """
+    Version of the listing list pages, from the listing and review count
+    versions that the post_save/post_delete signals bump
+    """
+    return f'{count_cache_version(Listing)}.{count_cache_version(Review)}'
+
+
+def _listing_list_etag(request, *args, **kwargs):
+    """ETag of a listing list or search page"""
+    return _listing_pages_version()
+
+
+def _listing_etag(request, listing_id=None, **kwargs):
+    """
+    ETag of a single listing, or None if it doesn't exist
+    
+    SQLite keeps updated_at to the millisecond, so the listing count
+    version, which every save bumps, is included too.
+    """
+    updated_at = Listing.objects.filter(listing_id=listing_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return f'{updated_at.isoformat()}.{count_cache_version(Listing)}'
+
+
+def _nested_listing_version():
+    """
+    Version of the listing (with its rating) and users nested in the
+    review and booking pages of a listing
+    """
+    return f'{_listing_pages_version()}.{count_cache_version(User)}'
+
+
+def _listing_reviews_etag(request, listing_id=None, **kwargs):
+    """
+    ETag of a listing's reviews; the count changes when one is deleted
+    """
+    stats = Review.objects.filter(listing_id=listing_id).aggregate(
+        last=Max('updated_at'),
+        count=Count('review_id'),
+    )
+    if not stats['count']:
+        return None
+    return f"{stats['count']}.{stats['last'].isoformat()}.{_nested_listing_version()}"
+
+
+def _listing_bookings_etag(request, listing_id=None, **kwargs):
+    """
+    ETag of a listing's bookings, including their payments, which are
+    rendered with them
+    """
+    stats = Booking.objects.filter(listing_id=listing_id).aggregate(
+        last=Max('updated_at'),
+        last_payment=Max('payment__updated_at'),
+        count=Count('booking_id'),
+    )
+    if not stats['count']:
+        return None
+    last_payment = stats['last_payment'].isoformat() if stats['last_payment'] else ''
+    return f"{stats['count']}.{stats['last'].isoformat()}.{last_payment}.{_nested_listing_version()}"
+
+
+def _cache_anonymous_listing_page(view_func):
+    """
+    Cache the response data of an anonymous listing list view by URL
+    
+    Keys carry the listing pages version, so a saved listing or review
+    (which updates the listing's rating) makes every cached page stale.
+    Requests with credentials are never cached.
+    """
+    @wraps(view_func)
+    def wrapped(self, request, *args, **kwargs):
+        if request.user.is_authenticated or 'HTTP_AUTHORIZATION' in request.META:
+            return view_func(self, request, *args, **kwargs)
+        
+        key = 'listing:page:{}:{}'.format(
+            _listing_pages_version(),
+            hashlib.md5(request.build_absolute_uri().encode()).hexdigest(),
+        )
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        
+        response = view_func(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, LISTING_PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapped
+
 
 class ListingViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing travel listings.
     Provides CRUD operations for listings with additional filtering capabilities.
     """
-    queryset = Listing.objects.all()
+    queryset = Listing.objects.select_related('host')
     serializer_class = ListingSerializer
     lookup_field = 'listing_id'
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ListingFilter
+    
+    # Actions that render many listings with ListingListSerializer
+    LIST_ACTIONS = ('list', 'search')
+
+    def get_serializer_class(self):
+        """Use the lighter serializer when rendering many listings"""
+        if self.action in self.LIST_ACTIONS:
+            return ListingListSerializer
+        return ListingSerializer
+
+    @method_decorator(condition(etag_func=_listing_list_etag))
+    @_cache_anonymous_listing_page
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(condition(etag_func=_listing_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_queryset(self):
         """
-        Optionally restricts the returned listings by filtering against
-        query parameters in the URL.
+        Listings ordered newest first; query parameter filters are applied
+        by ListingFilter.
         """
-        queryset = Listing.objects.all()
-        
-        # Filter by location
-        location = self.request.query_params.get('location', None)
-        if location is not None:
-            queryset = queryset.filter(location__icontains=location)
-        
-        # Filter by property type
-        property_type = self.request.query_params.get('property_type', None)
-        if property_type is not None:
-            queryset = queryset.filter(property_type=property_type)
-        
-        # Filter by availability
-        available = self.request.query_params.get('available', None)
-        if available is not None:
-            available_bool = available.lower() in ['true', '1', 'yes']
-            queryset = queryset.filter(available=available_bool)
-        
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price', None)
-        if min_price is not None:
-            try:
-                queryset = queryset.filter(price_per_night__gte=float(min_price))
-            except ValueError:
-                pass
-        
-        max_price = self.request.query_params.get('max_price', None)
-        if max_price is not None:
-            try:
-                queryset = queryset.filter(price_per_night__lte=float(max_price))
-            except ValueError:
-                pass
-        
-        # Filter by number of guests
-        guests = self.request.query_params.get('guests', None)
-        if guests is not None:
-            try:
-                queryset = queryset.filter(max_guests__gte=int(guests))
-            except ValueError:
-                pass
+        # Lists render neither the host nor the long text fields; the detail
+        # serializer nests the host. Review stats are stored on the listing.
+        if self.action in self.LIST_ACTIONS:
+            queryset = Listing.objects.defer('description', 'amenities')
+        else:
+            queryset = Listing.objects.select_related('host').defer(*_user_defers('host'))
         
         return queryset.order_by('-created_at')
 
@@ -103,23 +211,21 @@ class ListingViewSet(viewsets.ModelViewSet):
             openapi.Parameter('max_price', openapi.IN_QUERY, description="Maximum price per night", type=openapi.TYPE_NUMBER),
             openapi.Parameter('guests', openapi.IN_QUERY, description="Minimum number of guests", type=openapi.TYPE_INTEGER),
         ],
-        responses={200: ListingSerializer(many=True)}
+        responses={200: ListingListSerializer(many=True)}
     )
     @action(detail=False, methods=['get'])
+    @method_decorator(condition(etag_func=_listing_list_etag))
+    @_cache_anonymous_listing_page
     def search(self, request):
         """
         Advanced search endpoint for listings with multiple filters
         """
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         
-        # Search in name and description
+        # Full-text search in name, description and amenities
         search_query = request.query_params.get('search', None)
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | 
-                Q(description__icontains=search_query) |
-                Q(amenities__icontains=search_query)
-            )
+            queryset = queryset.search(search_query)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -130,29 +236,47 @@ class ListingViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @swagger_auto_schema(
-        responses={200: ReviewSerializer(many=True)}
+        responses={200: ReviewListSerializer(many=True)}
     )
     @action(detail=True, methods=['get'])
+    @method_decorator(condition(etag_func=_listing_reviews_etag))
     def reviews(self, request, listing_id=None):
         """
         Get all reviews for a specific listing
         """
         listing = self.get_object()
-        reviews = listing.reviews.all().order_by('-created_at')
-        serializer = ReviewSerializer(reviews, many=True)
+        reviews = listing.reviews.select_related('user').defer(*_user_defers('user')).order_by('-created_at')
+        
+        page = self.paginate_queryset(reviews)
+        if page is not None:
+            serializer = ReviewListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = ReviewListSerializer(reviews.iterator(chunk_size=500), many=True)
         return Response(serializer.data)
 
     @swagger_auto_schema(
         responses={200: BookingSerializer(many=True)}
     )
     @action(detail=True, methods=['get'])
+    @method_decorator(condition(etag_func=_listing_bookings_etag))
     def bookings(self, request, listing_id=None):
         """
         Get all bookings for a specific listing (for hosts)
         """
         listing = self.get_object()
-        bookings = listing.bookings.all().order_by('-created_at')
-        serializer = BookingSerializer(bookings, many=True)
+        bookings = (
+            listing.bookings.with_related()
+            .defer(*_user_defers('user', 'listing__host'), 'payment__webhook_data')
+            .order_by('-created_at')
+        )
+        
+        page = self.paginate_queryset(bookings)
+        if page is not None:
+            serializer = BookingSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = BookingSerializer(bookings.iterator(chunk_size=500), many=True)
         return Response(serializer.data)
 
 
@@ -160,33 +284,24 @@ class BookingViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing bookings with integrated payment processing and email notifications.
     """
-    queryset = Booking.objects.all()
+    queryset = Booking.objects.with_related()
     serializer_class = BookingSerializer
     lookup_field = 'booking_id'
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = BookingFilter
 
     def get_queryset(self):
         """
-        Filter bookings based on query parameters
+        Bookings ordered newest first; query parameter filters are applied
+        by BookingFilter.
         """
-        queryset = Booking.objects.all()
-        
-        # Filter by status
-        status_filter = self.request.query_params.get('status', None)
-        if status_filter is not None:
-            queryset = queryset.filter(status=status_filter)
-        
-        # Filter by user (for guests to see their bookings)
-        user_id = self.request.query_params.get('user_id', None)
-        if user_id is not None:
-            try:
-                queryset = queryset.filter(user_id=int(user_id))
-            except ValueError:
-                pass
-        
-        # Filter by listing (for hosts to see bookings for their listings)
-        listing_id = self.request.query_params.get('listing_id', None)
-        if listing_id is not None:
-            queryset = queryset.filter(listing__listing_id=listing_id)
+        # Only join the relations of the fields the client asked for
+        fields = BookingSerializer.requested_fields(self.request)
+        if fields is not None:
+            fields = {name.partition('.')[0] for name in fields}
+        queryset = Booking.objects.with_related(fields).defer(
+            *_user_defers('user', 'listing__host'), 'payment__webhook_data'
+        )
         
         return queryset.order_by('-created_at')
 
@@ -211,51 +326,36 @@ class BookingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Create booking
-        booking = serializer.save()
-        
-        try:
-            # Get payment and initiate with Chapa
-            payment = booking.payment
-            chapa_service = ChapaPaymentService()
-            chapa_response = chapa_service.initiate_payment(payment)
-            
-            # Send email notifications asynchronously
-            try:
-                # Send booking confirmation email to customer
-                send_booking_confirmation_email.delay(str(booking.booking_id))
-                logger.info(f"Booking confirmation email task queued for booking {booking.booking_id}")
-                
-                # Send notification email to host
-                send_host_notification_email.delay(str(booking.booking_id))
-                logger.info(f"Host notification email task queued for booking {booking.booking_id}")
-                
-            except Exception as email_error:
-                # Log email error but don't fail the booking creation
-                logger.warning(f"Failed to queue email tasks for booking {booking.booking_id}: {str(email_error)}")
-            
-            # Prepare response
-            response_data = {
-                'booking': BookingSerializer(booking).data,
-                'payment_url': payment.chapa_checkout_url,
-                'payment_id': payment.payment_id,
-                'message': 'Booking created successfully. Please complete payment to confirm your booking. Confirmation emails have been sent.'
-            }
+        # Create the booking and queue its tasks together, so neither the
+        # payment task nor the emails are sent for a booking rolled back
+        with transaction.atomic():
+            # The payment is created and initiated by a Celery task
+            booking = serializer.save()
             
-            return Response(response_data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            # If payment initiation fails, update booking status
-            booking.status = 'payment_failed'
-            booking.save()
-            
-            logger.error(f"Payment initiation failed for booking {booking.booking_id}: {str(e)}")
-            
-            return Response({
-                'error': 'Booking created but payment initiation failed',
-                'details': str(e),
-                'booking_id': str(booking.booking_id)
-            }, status=status.HTTP_402_PAYMENT_REQUIRED)
+            # Send the customer confirmation and host notification in one
+            # task once the booking is committed; robust=True logs a broker
+            # failure instead of failing the booking creation
+            transaction.on_commit(
+                lambda: send_booking_emails.delay(str(booking.booking_id)),
+                robust=True
+            )
+            logger.info("Booking email task queued for booking %s", booking.booking_id)
+        
+        # Reload with the listing, host, user and payment joined, instead of
+        # loading each lazily while the response is rendered
+        booking = self.get_queryset().get(pk=booking.pk)
+        
+        # Prepare response; the checkout URL is available from payment_status
+        # once the payment has been initiated
+        response_data = {
+            'booking': self.get_serializer(booking).data,
+            'payment_url': None,
+            'payment_id': None,
+            'payment_status': 'pending',
+            'message': 'Booking created successfully. Your payment is being prepared; check the payment status for the checkout link. Confirmation emails will be sent shortly.'
+        }
+        
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
     @swagger_auto_schema(
         method='patch',
@@ -280,28 +380,38 @@ class BookingViewSet(viewsets.ModelViewSet):
         new_status = request.data.get('status')
         old_status = booking.status
         
-        valid_statuses = ['pending', 'confirmed', 'cancelled', 'completed', 'payment_pending', 'payment_failed']
-        if new_status not in valid_statuses:
+        if new_status not in VALID_BOOKING_STATUSES:
             return Response(
-                {'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'},
+                {'error': f'Invalid status. Must be one of: {", ".join(sorted(VALID_BOOKING_STATUSES))}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         booking.status = new_status
-        booking.save()
+        # Reactivating a booking is rejected by the database if its dates
+        # now overlap another active booking (migration 0011)
+        try:
+            with transaction.atomic():
+                booking.save(update_fields=['status'])
+        except IntegrityError:
+            return Response(
+                {'error': 'These dates are not available'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Send email notifications for certain status changes
-        try:
-            if new_status == 'confirmed' and old_status != 'confirmed':
-                send_booking_confirmation_email.delay(str(booking.booking_id))
-                logger.info(f"Booking confirmation email task queued for status update: {booking.booking_id}")
-            
-            elif new_status == 'cancelled' and old_status != 'cancelled':
-                send_booking_cancellation_email.delay(str(booking.booking_id))
-                logger.info(f"Booking cancellation email task queued for status update: {booking.booking_id}")
-                
-        except Exception as email_error:
-            logger.warning(f"Failed to queue email tasks for booking status update {booking.booking_id}: {str(email_error)}")
+        if new_status == 'confirmed' and old_status != 'confirmed':
+            transaction.on_commit(
+                lambda: send_booking_confirmation_email.delay(str(booking.booking_id)),
+                robust=True
+            )
+            logger.info("Booking confirmation email task queued for status update: %s", booking.booking_id)
+        
+        elif new_status == 'cancelled' and old_status != 'cancelled':
+            transaction.on_commit(
+                lambda: send_booking_cancellation_email.delay(str(booking.booking_id)),
+                robust=True
+            )
+            logger.info("Booking cancellation email task queued for status update: %s", booking.booking_id)
         
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
@@ -331,27 +441,77 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         old_status = booking.status
         booking.status = 'cancelled'
-        booking.save()
+        booking.save(update_fields=['status'])
         
         # Cancel payment if exists
         try:
             payment = booking.payment
-            if payment.status in ['pending', 'processing']:
+            if payment.is_pending:
                 payment.status = 'cancelled'
-                payment.save()
+                payment.save(update_fields=['status'])
         except Payment.DoesNotExist:
             pass
         
         # Send cancellation email
-        try:
-            send_booking_cancellation_email.delay(str(booking.booking_id))
-            logger.info(f"Booking cancellation email task queued for cancellation: {booking.booking_id}")
-        except Exception as email_error:
-            logger.warning(f"Failed to queue cancellation email task for booking {booking.booking_id}: {str(email_error)}")
+        transaction.on_commit(
+            lambda: send_booking_cancellation_email.delay(str(booking.booking_id)),
+            robust=True
+        )
+        logger.info("Booking cancellation email task queued for cancellation: %s", booking.booking_id)
         
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        method='post',
+        request_body=BookingBulkStatusSerializer,
+        responses={200: 'Number and IDs of the updated bookings'}
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """
+        Set the status of many bookings in a single UPDATE, with the same
+        email notifications as update_status
+        """
+        serializer = BookingBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        booking_ids = serializer.validated_data['booking_ids']
+        new_status = serializer.validated_data['status']
+        
+        # Bookings whose dates overlap each other or another active booking
+        # can't all be made active; the database rejects the whole batch
+        try:
+            with transaction.atomic():
+                # Only bookings whose status actually changes are notified
+                changed = list(
+                    Booking.objects.filter(booking_id__in=booking_ids)
+                    .exclude(status=new_status)
+                    .values_list('booking_id', flat=True)
+                )
+                updated = Booking.objects.filter(booking_id__in=changed).update(status=new_status)
+        except IntegrityError:
+            return Response(
+                {'error': 'These dates are not available'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # update() sends no post_save signals
+        invalidate_counts(Booking)
+        
+        email_task = {
+            'confirmed': send_booking_confirmation_email,
+            'cancelled': send_booking_cancellation_email,
+        }.get(new_status)
+        if email_task and changed:
+            emails = group(email_task.s(str(booking_id)) for booking_id in changed)
+            transaction.on_commit(emails.apply_async, robust=True)
+            logger.info("Queued %d %s email tasks for bulk status update", len(changed), new_status)
+        
+        return Response({
+            'updated': updated,
+            'booking_ids': [str(booking_id) for booking_id in changed],
+        })
+
     @swagger_auto_schema(
         responses={200: PaymentStatusSerializer}
     )
@@ -360,19 +520,28 @@ class BookingViewSet(viewsets.ModelViewSet):
         """
         Get payment status for a booking
         """
-        booking = self.get_object()
-        
-        try:
-            payment = booking.payment
-            chapa_service = ChapaPaymentService()
-            payment_status = chapa_service.get_payment_status(str(payment.payment_id))
-            return Response(payment_status)
-            
-        except Payment.DoesNotExist:
+        # Only the payment's ID is needed; get_payment_status reads the rest
+        payment_id = (
+            Payment.objects.filter(booking_id=booking_id)
+            .values_list('payment_id', flat=True)
+            .first()
+        )
+        if payment_id is None:
+            if not Booking.objects.filter(booking_id=booking_id).exists():
+                return Response(
+                    {'error': 'Booking not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             return Response(
                 {'error': 'No payment found for this booking'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        try:
+            chapa_service = get_chapa_service()
+            payment_status = chapa_service.get_payment_status(str(payment_id))
+            return Response(payment_status)
+            
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -384,23 +553,17 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for managing payments (read-only)
     """
-    queryset = Payment.objects.all()
+    queryset = Payment.objects.defer('webhook_data')
     serializer_class = PaymentSerializer
     lookup_field = 'payment_id'
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = PaymentFilter
 
     def get_queryset(self):
-        """Filter payments based on query parameters"""
-        queryset = Payment.objects.all()
-        
-        # Filter by status
-        status_filter = self.request.query_params.get('status', None)
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        # Filter by booking
-        booking_id = self.request.query_params.get('booking_id', None)
-        if booking_id:
-            queryset = queryset.filter(booking__booking_id=booking_id)
+        """Payments ordered newest first; filtered by PaymentFilter"""
+        # The serializer renders the booking as its ID, so nothing is joined;
+        # the raw webhook payload isn't rendered
+        queryset = Payment.objects.defer('webhook_data')
         
         return queryset.order_by('-created_at')
 
@@ -420,22 +583,25 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         customer_phone = serializer.validated_data.get('customer_phone')
         
         try:
-            booking = Booking.objects.get(booking_id=booking_id)
+            # The existing payment, if any, comes back in the same query, so
+            # the completed-payment guard needs no separate lookup; the
+            # listing is read when building the Chapa request
+            booking = Booking.objects.select_related('user', 'listing', 'payment').get(booking_id=booking_id)
             
-            # Check if payment already exists
-            if hasattr(booking, 'payment'):
+            try:
                 payment = booking.payment
-                if payment.status in ['completed']:
+            except Payment.DoesNotExist:
+                # Create payment if it doesn't exist
+                payment = create_payment_for_booking(booking, customer_phone)
+            else:
+                if payment.status == 'completed':
                     return Response(
                         {'error': 'Payment already completed for this booking'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
-            else:
-                # Create payment if it doesn't exist
-                payment = create_payment_for_booking(booking, customer_phone)
             
             # Initiate payment with Chapa
-            chapa_service = ChapaPaymentService()
+            chapa_service = get_chapa_service()
             chapa_response = chapa_service.initiate_payment(payment)
             
             return Response({
@@ -451,7 +617,7 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Payment initiation error: {str(e)}")
+            logger.error("Payment initiation error: %s", e)
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -476,7 +642,7 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
             payment = Payment.objects.get(chapa_reference=tx_ref)
             
             # Verify with Chapa
-            chapa_service = ChapaPaymentService()
+            chapa_service = get_chapa_service()
             verification_response = chapa_service.verify_payment(tx_ref)
             
             # Update payment status
@@ -484,11 +650,11 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
             
             # Send payment confirmation email if payment is successful
             if payment.is_successful:
-                try:
-                    send_payment_confirmation_email.delay(str(payment.payment_id))
-                    logger.info(f"Payment confirmation email task queued for payment {payment.payment_id}")
-                except Exception as email_error:
-                    logger.warning(f"Failed to queue payment confirmation email for payment {payment.payment_id}: {str(email_error)}")
+                transaction.on_commit(
+                    lambda: send_payment_confirmation_email.delay(str(payment.payment_id)),
+                    robust=True
+                )
+                logger.info("Payment confirmation email task queued for payment %s", payment.payment_id)
             
             # Return updated status
             payment_status = chapa_service.get_payment_status(str(payment.payment_id))
@@ -500,7 +666,7 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Payment verification error: {str(e)}")
+            logger.error("Payment verification error: %s", e)
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -510,41 +676,41 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
 @method_decorator(csrf_exempt, name='dispatch')
 class ChapaWebhookView(APIView):
     """
-    Handle webhook notifications from Chapa with email notifications
+    Receive webhook notifications from Chapa and queue them for processing
     """
     
     def post(self, request):
         """
-        Process webhook notification from Chapa
+        Check a webhook notification from Chapa and queue it for processing
         """
         try:
-            # Parse webhook data
+            # Read the raw body before request.data consumes the stream
+            raw_body = request.body
             webhook_data = request.data
             
-            logger.info(f"Received Chapa webhook: {webhook_data}")
+            # Only the reference and status are logged, not the whole payload
+            if isinstance(webhook_data, list):
+                logger.info("Received Chapa webhook batch of %d events", len(webhook_data))
+            else:
+                logger.info(
+                    "Received Chapa webhook for tx_ref %s with status %s",
+                    webhook_data.get('tx_ref'), webhook_data.get('status')
+                )
             
-            # Handle webhook with Chapa service
-            chapa_service = ChapaPaymentService()
-            payment = chapa_service.handle_webhook(webhook_data)
+            chapa_service = get_chapa_service()
+            signature = request.headers.get('Chapa-Signature') or request.headers.get('X-Chapa-Signature')
+            signature_verified = chapa_service.verify_webhook_signature(raw_body, signature)
+            if chapa_service.webhook_secret and signature and not signature_verified:
+                logger.warning("Rejected Chapa webhook with an invalid signature")
+                return Response({'status': 'error'}, status=status.HTTP_401_UNAUTHORIZED)
             
-            if payment:
-                logger.info(f"Webhook processed successfully for payment {payment.payment_id}")
-                
-                # Send confirmation email if payment completed
-                if payment.is_successful:
-                    try:
-                        send_payment_confirmation_email.delay(str(payment.payment_id))
-                        logger.info(f"Payment confirmation email task queued from webhook for payment {payment.payment_id}")
-                    except Exception as email_error:
-                        logger.warning(f"Failed to queue payment confirmation email from webhook for payment {payment.payment_id}: {str(email_error)}")
-                
-                return Response({'status': 'success'})
-            else:
-                logger.warning("Webhook processing failed - payment not found or error occurred")
-                return Response({'status': 'error'}, status=status.HTTP_400_BAD_REQUEST)
+            # Processing, including any verify API call, happens in a task
+            process_chapa_webhook.delay(webhook_data, signature_verified=signature_verified)
+            
+            return Response({'status': 'queued'})
                 
         except Exception as e:
-            logger.error(f"Webhook processing error: {str(e)}")
+            logger.error("Webhook processing error: %s", e)
             return Response({'status': 'error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -553,36 +719,28 @@ class ReviewViewSet(viewsets.ModelViewSet):
     ViewSet for managing reviews.
     Provides CRUD operations for reviews.
     """
-    queryset = Review.objects.all()
+    queryset = Review.objects.with_related()
     serializer_class = ReviewSerializer
     lookup_field = 'review_id'
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ReviewFilter
+
+    def get_serializer_class(self):
+        """Use the lighter serializer when rendering many reviews"""
+        if self.action == 'list':
+            return ReviewListSerializer
+        return ReviewSerializer
 
     def get_queryset(self):
         """
-        Filter reviews based on query parameters
+        Reviews ordered newest first; query parameter filters are applied
+        by ReviewFilter.
         """
-        queryset = Review.objects.all()
-        
-        # Filter by listing
-        listing_id = self.request.query_params.get('listing_id', None)
-        if listing_id is not None:
-            queryset = queryset.filter(listing__listing_id=listing_id)
-        
-        # Filter by user
-        user_id = self.request.query_params.get('user_id', None)
-        if user_id is not None:
-            try:
-                queryset = queryset.filter(user_id=int(user_id))
-            except ValueError:
-                pass
-        
-        # Filter by rating
-        min_rating = self.request.query_params.get('min_rating', None)
-        if min_rating is not None:
-            try:
-                queryset = queryset.filter(rating__gte=int(min_rating))
-            except ValueError:
-                pass
+        # Lists render the listing as its ID, so only the reviewer is joined
+        if self.action == 'list':
+            queryset = Review.objects.select_related('user').defer(*_user_defers('user'))
+        else:
+            queryset = Review.objects.with_related().defer(*_user_defers('user', 'listing__host'))
         
         return queryset.order_by('-created_at')
 